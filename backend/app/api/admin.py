@@ -0,0 +1,95 @@
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from app.api.models import (
+    OutboxStats,
+    ProfileFile,
+    ProfilingConfig,
+    ProfilingStatus,
+    SyncJob,
+)
+from app.core.config import settings
+from app.core.profiling import profiler
+from app.core.security import require_admin
+from app.services.outbox import outbox
+from app.services.sync_jobs import SyncBusy, sync_runner
+
+router = APIRouter()
+# Syncs rewrite the entity collection, so they are admin-only like the profiler;
+# without ADMIN_TOKEN both answer 404
+sync = APIRouter(prefix="/sync", dependencies=[Depends(require_admin)])
+profiling = APIRouter(prefix="/profiling", dependencies=[Depends(require_admin)])
+
+
+def _trigger(**kwargs) -> SyncJob:
+    try:
+        return sync_runner.trigger(**kwargs)
+    except SyncBusy as e:
+        raise HTTPException(status_code=409, detail=f"{e}, try again when it finishes")
+
+
+@sync.post("", response_model=SyncJob, status_code=202)
+async def start_sync(full: bool = False, replay: bool = False):
+    """
+    Starts an entity sync, or returns the same kind of sync if it is already running
+    (409 for a different kind). `replay` syncs the entities of the last snapshot
+    instead of scraping parliament.bg.
+    """
+    if not replay:
+        return _trigger(full=full)
+    if not settings.SYNC_SNAPSHOT_PATH:
+        raise HTTPException(status_code=400, detail="SYNC_SNAPSHOT_PATH is not set")
+    return _trigger(trigger="replay", snapshot=settings.SYNC_SNAPSHOT_PATH)
+
+
+@sync.get("/jobs", response_model=List[SyncJob])
+async def sync_jobs():
+    return sync_runner.list()
+
+
+@sync.get("/jobs/{job_id}", response_model=SyncJob)
+async def sync_job(job_id: str):
+    job = sync_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown sync job")
+    return job
+
+
+@router.get("/outbox/stats", response_model=OutboxStats)
+async def outbox_stats():
+    return await outbox.stats()
+
+
+@profiling.get("", response_model=ProfilingStatus)
+async def profiling_status():
+    return profiler.status()
+
+
+@profiling.put("", response_model=ProfilingStatus)
+async def configure_profiling(config: ProfilingConfig):
+    """Samples `sample_rate` of all requests, or every request to `route`."""
+    return profiler.configure(config)
+
+
+@profiling.post("/sync", response_model=SyncJob, status_code=202)
+async def profile_sync(full: bool = False):
+    """Starts a profiled sync. 409 while an unprofiled sync is running."""
+    return _trigger(full=full, profile=True)
+
+
+@profiling.get("/profiles", response_model=List[ProfileFile])
+async def list_profiles():
+    return profiler.list_files()
+
+
+@profiling.get("/profiles/{filename}")
+async def download_profile(filename: str):
+    path = profiler.file_path(filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    media_type = "application/json" if filename.endswith(".json") else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=filename)
+
+
+router.include_router(sync)
+router.include_router(profiling)
@@ -1,75 +1,135 @@
-from typing import List
-from fastapi import APIRouter, HTTPException
-from app.api.models import OTPRequest, VerifyRequest, Template, Entity
-from app.core.security import hash_email
+import math
+import uuid
+from typing import Any, Awaitable, Callable, List, Optional
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from app.api.models import (
+    DeliveryRecipient,
+    DeliveryStatus,
+    Eligibility,
+    EntityPage,
+    EntityType,
+    OTPRequest,
+    OutboxState,
+    OutgoingMail,
+    Template,
+    TemplateView,
+    VerifyRequest,
+)
+from app.core.security import client_ip, hash_email
 from app.core.config import settings
-from app.services.pb_service import pb
+from app.core.http_cache import make_etag, not_modified, respond
 from app.services.authenticator import authenticator
+from app.services.eligibility import eligibility
+from app.services.entity_index import entity_index
+from app.services.idempotency import RequestInProgress, idempotency
 from app.services.mail_service import mail_sender
+from app.services.outbox import DELIVERED_STATES, outbox
+from app.services.rate_limits import otp_limiter
 from app.services.template_manager import template_manager
-from datetime import datetime, timedelta, timezone
+from app.services.template_renderer import placeholder_values
 
 router = APIRouter()
 
 
+TEMPLATES_CACHE_CONTROL = (
+    f"public, max-age={settings.TEMPLATES_MAX_AGE_SECONDS}, "
+    f"stale-while-revalidate={settings.TEMPLATES_STALE_WHILE_REVALIDATE_SECONDS}"
+)
+PREVIEW_CACHE_CONTROL = f"private, max-age={settings.TEMPLATES_MAX_AGE_SECONDS}"
+# Optional client key, so that a deliberate resend isn't taken for a duplicate
+IdempotencyKey = Header(default=None, max_length=255)
+
+
+async def _run_once(key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+    try:
+        return await idempotency.run(key, call)
+    except RequestInProgress:
+        raise HTTPException(
+            status_code=409,
+            detail="The same request is already being processed.",
+            headers={"Retry-After": "1"},
+        )
+
+
 @router.get("/templates", response_model=List[Template])
-async def get_templates():
-    return template_manager.get_templates()
+async def get_templates(request: Request, view: TemplateView = TemplateView.FULL):
+    """`view=summary` leaves out the template content, the preview endpoint renders it."""
+    encoded = await template_manager.get_templates_response(view)
+    return respond(request, encoded, TEMPLATES_CACHE_CONTROL)
 
 
 @router.get("/templates/{template_id}/preview")
-async def preview_template(template_id: str, name: str, surname: str):
-    template = template_manager.get_template(template_id)
-    if not template.target_entities:
-        return {"content": template.content}
+async def preview_template(request: Request, template_id: str, name: str, surname: str):
+    template = await template_manager.get_template(template_id)
+    entity = None
+    if template.target_entities:
+        try:
+            entity = await template_manager.get_entity(template.target_entities[0])
+        except Exception:
+            pass
+
+    # The preview only changes with the template, the entity or the query
+    etag = make_etag(
+        template.id,
+        template.updated,
+        entity.id if entity else None,
+        entity.updated if entity else None,
+        name,
+        surname,
+    )
+    headers = {"ETag": etag, "Cache-Control": PREVIEW_CACHE_CONTROL}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
 
-    ent_id = template.target_entities[0]
-    try:
-        entity_record = pb.collection("entity").get_one(ent_id)
-        entity = Entity.model_validate(entity_record)
-        entity_name = entity.name
-    except Exception:
-        entity_name = "[Име на институция]"
-
-    replacers = {
-        "{sender_name}": name,
-        "{sender_surname}": surname,
-        "{user_name}": name,
-        "{user_surname}": surname,
-        "{entity_name}": entity_name,
-    }
-    content = template_manager.fill_template(template.content, **replacers)
-    return {"content": content}
+    if not template.target_entities:
+        content = template.content
+    else:
+        entity_name = entity.name if entity else "[Име на институция]"
+        values = placeholder_values(name, surname, entity_name)
+        content = template_manager.render(template, values)
+    return JSONResponse({"content": content}, headers=headers)
+
+
+@router.get("/entities", response_model=EntityPage)
+async def search_entities(
+    q: str = Query(default="", max_length=200),
+    ent_type: List[EntityType] = Query(default=[]),
+    page: int = Query(default=1, ge=1),
+    per_page: int = Query(default=30, ge=1, le=200),
+):
+    """Prefix search over entity names, in Cyrillic or Latin, served from memory."""
+    result = await entity_index.search(q, ent_type, page, per_page)
+    # The entities are already validated, so skip the response_model round trip
+    return Response(result.model_dump_json(), media_type="application/json")
 
 
 @router.post("/request-otp")
-async def request_otp(payload: OTPRequest):
+async def request_otp(
+    payload: OTPRequest, request: Request, idempotency_key: Optional[str] = IdempotencyKey
+):
     mail_hash = hash_email(payload.mail)
+    key = idempotency.key("request-otp", mail_hash, payload.template_id, idempotency_key)
+    return await _run_once(key, lambda: _request_otp(payload, request, mail_hash))
 
-    # Check rate limit (168 hours)
-    limit_time = datetime.now(timezone.utc) - timedelta(hours=settings.RATE_LIMIT_HOURS)
-    existing_logs = pb.collection("sent_mail_logs").get_list(
-        1,
-        1,
-        query_params={
-            "filter": f'user_mail_hash = "{mail_hash}" && created > "{limit_time.isoformat()}"'
-        },
-    )
 
-    if existing_logs.items:
+async def _request_otp(payload: OTPRequest, request: Request, mail_hash: str):
+    retry_after = await otp_limiter.check(client_ip(request), mail_hash)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests. Try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+    # Check rate limit (168 hours) and deduplication in one lookup
+    status = await eligibility.check(mail_hash, payload.template_id)
+    if status == Eligibility.RATE_LIMITED or await outbox.has_open_job(mail_hash):
         raise HTTPException(
             status_code=429, detail="Rate limit exceeded. Try again later."
         )
 
-    # Check deduplication
-    duplicate_template = pb.collection("sent_mail_logs").get_list(
-        1,
-        1,
-        query_params={
-            "filter": f'user_mail_hash = "{mail_hash}" && template_id = "{payload.template_id}"'
-        },
-    )
-    if duplicate_template.items:
+    if status == Eligibility.DUPLICATE:
         raise HTTPException(
             status_code=400, detail="You have already sent this template."
         )
@@ -90,54 +150,90 @@ async def request_otp(payload: OTPRequest):
 
 # TODO: Provide full entity information when sending the preview
 @router.post("/verify-and-send")
-async def verify_and_send(payload: VerifyRequest):
+async def verify_and_send(
+    payload: VerifyRequest, idempotency_key: Optional[str] = IdempotencyKey
+):
     mail_hash = hash_email(payload.mail)
+    # The code is part of the key, so only its holder can see the replayed delivery
+    key = idempotency.key(
+        "verify-and-send", mail_hash, payload.template_id, idempotency_key, payload.otp_code
+    )
+    return await _run_once(key, lambda: _verify_and_send(payload, mail_hash))
+
 
+async def _verify_and_send(payload: VerifyRequest, mail_hash: str):
     is_valid = await authenticator.verify_code(mail_hash, payload.otp_code)
     if not is_valid:
         raise HTTPException(status_code=400, detail="Invalid or expired OTP")
 
-    # WARN: This assumes that there is only one entity a template can be sent to.
-    # There are multiple and the application should do only 1 send action
-    template = template_manager.get_template(payload.template_id)
-    # TODO: Implement the collection of entities according to template_id and sending the mail
+    template = await template_manager.get_template(payload.template_id)
     related = template.expand
-    if related is None:
-        raise Exception("unexpected 0-relatinship template")
-    entity = Entity.model_validate(related.target_entities[0])
-
-    replacers = {
-        "{sender_name}": payload.name,
-        "{sender_surname}": payload.surname,
-        "{user_name}": payload.name,
-        "{user_surname}": payload.surname,
-        "{sender_domain}": payload.mail.split("@")[1],
-        "{entity_name}": entity.name,
-    }
-
-    receivers = [e.email for e in related.target_entities]
-
-    content = template_manager.fill_template(template.content, **replacers)
+    if related is None or not related.target_entities:
+        raise HTTPException(status_code=400, detail="Template has no target entities")
+    entities = related.target_entities
 
     reply_to = payload.mail
-    sender = f"{replacers['{sender_name}']}.{replacers['{sender_surname}']}@{settings.DOMAIN_NAME}"
+    sender = f"{payload.name}.{payload.surname}@{settings.DOMAIN_NAME}"
+    subject = "Гражданско писмо"  # Could be more dynamic
+
+    def letter(to_email: List[str], entity_name: str) -> OutgoingMail:
+        values = placeholder_values(payload.name, payload.surname, entity_name, payload.mail)
+        return OutgoingMail(
+            to_email=to_email,
+            sender=sender,
+            subject=subject,
+            content=template_manager.render(template, values),
+            reply_to=reply_to,
+        )
 
-    # Send actual mail to entity
-    await mail_sender.send_mail(
-        to_email=receivers,
-        sender=sender,
-        subject="Гражданско писмо",  # Could be more dynamic
-        content=content,
-        reply_to=reply_to,
+    # One personalized letter per entity, or a single letter addressed to all of them
+    if settings.MAIL_FANOUT:
+        mails = [letter([e.email], e.name) for e in entities]
+        entity_ids = [e.id for e in entities]
+    else:
+        mails = [letter([e.email for e in entities], entities[0].name)]
+        entity_ids = None
+
+    # The outbox workers send and log the letters
+    delivery_id = uuid.uuid4().hex
+    await outbox.enqueue(
+        mail_hash=mail_hash,
+        template_id=payload.template_id,
+        mails=mails,
+        entity_ids=entity_ids,
+        delivery_id=delivery_id,
     )
 
-    # Log the send
-    pb.collection("sent_mail_logs").create(
-        {
-            "user_mail_hash": mail_hash,
-            "template_id": payload.template_id,
-            "created": datetime.now(timezone.utc).isoformat(),
-        }
-    )
+    return {
+        "message": "Mail queued for delivery",
+        "delivery_id": delivery_id,
+        "recipients": len(mails),
+    }
+
 
-    return {"message": "Mail sent successfully"}
+@router.get("/deliveries/{delivery_id}", response_model=DeliveryStatus)
+async def get_delivery(delivery_id: str):
+    jobs = await outbox.get_delivery(delivery_id)
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Delivery not found")
+
+    recipients = [
+        DeliveryRecipient(
+            entity_id=job.entity_id,
+            to_email=job.to_email,
+            state=job.state,
+            attempts=job.attempts,
+            error=job.last_error,
+        )
+        for job in jobs
+    ]
+    delivered = sum(job.state in DELIVERED_STATES for job in jobs)
+    failed = sum(job.state == OutboxState.FAILED for job in jobs)
+    return DeliveryStatus(
+        delivery_id=delivery_id,
+        total=len(jobs),
+        delivered=delivered,
+        pending=len(jobs) - delivered - failed,
+        failed=failed,
+        recipients=recipients,
+    )
@@ -0,0 +1,44 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.services.circuit_breaker import breakers
+from app.services.eligibility import eligibility
+from app.services.mail_service import mail_sender
+from app.services.outbox import outbox
+from app.services.pb_service import pb
+
+router = APIRouter()
+
+
+async def readiness() -> JSONResponse:
+    """
+    Reports whether this worker can serve requests end to end. PocketBase is probed
+    live; a cold eligibility index is reported but doesn't fail the check, since
+    lookups fall back to PocketBase until it is warm. Circuit breaker states are
+    reported the same way.
+    """
+    checks = {
+        "pocketbase": await pb.health(),
+        "outbox": outbox.is_open,
+        "mail": mail_sender.configured(),
+    }
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "unavailable",
+            "checks": checks,
+            "eligibility_index_warm": eligibility.ready,
+            "circuits": {name: b.current_state().value for name, b in breakers.items()},
+        },
+    )
+
+
+@router.get("/health/live")
+async def live():
+    """The process is up and the event loop is responsive."""
+    return {"status": "alive"}
+
+
+@router.get("/health/ready")
+async def ready():
+    return await readiness()
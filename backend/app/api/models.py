@@ -1,9 +1,22 @@
 from enum import Enum
 from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel, EmailStr, ConfigDict, Field, HttpUrl
+from typing import Annotated, Any, Dict, List, Mapping, Optional, Self
+from pydantic import (
+    BaseModel,
+    EmailStr,
+    ConfigDict,
+    Field,
+    HttpUrl,
+    ValidationInfo,
+    ValidatorFunctionWrapHandler,
+    WrapValidator,
+)
 from pydantic_core import Url
 
+# Validation context flag for records that come from PocketBase
+TRUSTED_RECORD = "trusted_record"
+_TRUSTED_CONTEXT = {TRUSTED_RECORD: True}
+
 
 class EntityType(str, Enum):
     COMMITTEE = "commission"
@@ -19,6 +32,14 @@ class AuthState(str, Enum):
     EXPIRED = "expired"
 
 
+class OutboxState(str, Enum):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    LOGGED = "logged"
+    FAILED = "failed"
+
+
 class PBBaseModel(BaseModel):
     """Base model for PocketBase records"""
 
@@ -28,25 +49,60 @@ class PBBaseModel(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+    @classmethod
+    def from_record(cls, record: Mapping[str, Any]) -> Self:
+        """
+        Decodes a record PocketBase already validated. Parsing stays in pydantic-core,
+        but the pure-Python checks (email syntax) are skipped; anything coming from
+        outside PocketBase must go through `model_validate` instead.
+        """
+        return cls.model_validate(record, context=_TRUSTED_CONTEXT)
+
+
+def _trusted(value: Any, handler: ValidatorFunctionWrapHandler, info: ValidationInfo) -> Any:
+    if info.context and info.context.get(TRUSTED_RECORD):
+        return value
+    return handler(value)
+
+
+# Validated like EmailStr, except in records decoded with `from_record`
+TrustedEmailStr = Annotated[EmailStr, WrapValidator(_trusted)]
+
 
 class Entity(PBBaseModel):
     name: str
-    email: EmailStr
+    email: TrustedEmailStr
     ent_type: EntityType
     ent_source: str
 
 
+class EntityPage(BaseModel):
+    page: int
+    per_page: int
+    total_items: int
+    total_pages: int
+    items: List[Entity]
+
+
 class TemplateExpand(BaseModel):
     target_entities: List[Entity] = Field(default_factory=list)
 
 
-class Template(PBBaseModel):
-    content: str
+class TemplateSummary(PBBaseModel):
     name: str
     target_entities: List[str] = Field(default_factory=list)
     expand: Optional[TemplateExpand] = None
 
 
+class Template(TemplateSummary):
+    content: str
+
+
+class TemplateView(str, Enum):
+    FULL = "full"
+    SUMMARY = "summary"
+
+
 class AuthAttempt(PBBaseModel):
     user_mail_hash: str
     code: int
@@ -61,6 +117,120 @@ class SentLog(PBBaseModel):
     timestamp: datetime
 
 
+class SentMailLog(PBBaseModel):
+    user_mail_hash: str
+    template_id: str
+
+
+class Eligibility(str, Enum):
+    ELIGIBLE = "eligible"
+    RATE_LIMITED = "rate_limited"
+    DUPLICATE = "duplicate"
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class SyncJobState(str, Enum):
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class SyncProgress(BaseModel):
+    processed: int = 0
+    total: int = 0
+
+
+class SyncReport(BaseModel):
+    ent_types: List[EntityType] = Field(default_factory=list)
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    duplicates: int = 0
+    timings: Dict[str, float] = Field(default_factory=dict)
+
+
+class SyncJob(BaseModel):
+    id: str
+    state: SyncJobState
+    trigger: str
+    full: bool = False
+    started: datetime
+    finished: Optional[datetime] = None
+    progress: Dict[str, SyncProgress] = Field(default_factory=dict)
+    reports: List[SyncReport] = Field(default_factory=list)
+    error: Optional[str] = None
+    # Name of the profile captured for this run, if it was profiled
+    profile: Optional[str] = None
+    # Snapshot replayed instead of scraping, if any
+    snapshot: Optional[str] = None
+
+
+class OutgoingMail(BaseModel):
+    to_email: List[str]
+    sender: str
+    subject: str
+    content: str
+    reply_to: Optional[str] = None
+
+
+class OutboxJob(OutgoingMail):
+    id: int
+    mail_hash: str
+    template_id: str
+    state: OutboxState
+    attempts: int = 0
+    last_error: Optional[str] = None
+    entity_id: Optional[str] = None
+    delivery_id: Optional[str] = None
+
+
+class OutboxStats(BaseModel):
+    depth: int
+    in_flight: int
+    failed: int
+    delivered_total: int
+    drain_rate_per_minute: float
+
+
+class DeliveryRecipient(BaseModel):
+    entity_id: Optional[str] = None
+    to_email: List[str]
+    state: OutboxState
+    attempts: int = 0
+    error: Optional[str] = None
+
+
+class DeliveryStatus(BaseModel):
+    delivery_id: str
+    total: int
+    delivered: int
+    pending: int
+    failed: int
+    recipients: List[DeliveryRecipient]
+
+
+class ProfilingStatus(BaseModel):
+    enabled: bool
+    sample_rate: float
+    route: Optional[str] = None
+    until: Optional[datetime] = None
+    captured: int = 0
+    running: int = 0
+
+
+class ProfileFile(BaseModel):
+    name: str
+    size: int
+    created: datetime
+
+
 # --- Request Models ---
 
 
@@ -79,3 +249,13 @@ class VerifyRequest(BaseModel):
     surname: str
     template_id: str
     entity_id: str
+
+
+class ProfilingConfig(BaseModel):
+    enabled: bool = True
+    # Fraction of requests to profile, ignored when `route` is set
+    sample_rate: float = Field(default=0.01, ge=0.0, le=1.0)
+    # Profile every request to this path instead, e.g. /api/verify-and-send
+    route: Optional[str] = None
+    # Profiling switches itself off after this long
+    duration_seconds: float = Field(default=300.0, gt=0, le=86400)
@@ -5,8 +5,24 @@ class Settings(BaseSettings):
     POCKETBASE_URL: str = "http://localhost:8090"
     POCKETBASE_ADMIN: str = ""
     POCKETBASE_ADMIN_PW: str = ""
+    POCKETBASE_TIMEOUT: float = 10.0
+    POCKETBASE_MAX_CONNECTIONS: int = 20
+    # Max operations per /api/batch call (PocketBase's default limit is 50)
+    POCKETBASE_BATCH_SIZE: int = 50
+    POCKETBASE_WRITE_CONCURRENCY: int = 10
+    # Renew the superuser token this many seconds before it expires
+    POCKETBASE_TOKEN_REFRESH_MARGIN: float = 60.0
+
+    # Template/entity read cache
+    CACHE_TTL_SECONDS: int = 300
+    # Browser/CDN caching of the template endpoints; clients revalidate with the ETag
+    TEMPLATES_MAX_AGE_SECONDS: int = 60
+    TEMPLATES_STALE_WHILE_REVALIDATE_SECONDS: int = 300
+    PB_REALTIME_INVALIDATION: bool = False
 
     MAILTRAP_API_TOKEN: str = ""
+    MAILTRAP_API_URL: str = "https://send.api.mailtrap.io"
+    MAILTRAP_TIMEOUT: float = 30.0
     MAILTRAP_HOST: str = "smtp.mailtrap.io"
     MAILTRAP_PORT: int = 2525
     MAILTRAP_USER: str = ""
@@ -17,12 +33,104 @@ class Settings(BaseSettings):
     LOCAL_SMTP_HOST: str = "mailpit"
     LOCAL_SMTP_PORT: int = 1025
 
+    # SMTP connection pool
+    SMTP_POOL_SIZE: int = 5
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = 100
+    SMTP_IDLE_CHECK_SECONDS: float = 30.0
+    SMTP_TIMEOUT: float = 30.0
+
+    # Send a personalized letter to each target entity instead of one shared message
+    MAIL_FANOUT: bool = True
+
+    # Outbox (queued letter delivery)
+    OUTBOX_DB_PATH: str = "data/outbox.sqlite3"
+    OUTBOX_WORKERS: int = 4
+    OUTBOX_BATCH_SIZE: int = 50
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_RETRY_BASE_SECONDS: float = 2.0
+    OUTBOX_POLL_SECONDS: float = 5.0
+
+    # parliament.bg scraper pacing
+    SCRAPER_MAX_CONCURRENCY: int = 5
+    SCRAPER_INITIAL_RATE: float = 5.0
+    SCRAPER_MIN_RATE: float = 0.5
+    SCRAPER_MAX_RATE: float = 20.0
+    SCRAPER_LATENCY_THRESHOLD: float = 2.0
+    SCRAPER_MAX_RETRIES: int = 3
+    SCRAPER_CACHE_DIR: str = "data/scraper_cache"
+    # Only request detail pages for list entries that are new or changed. Emails are
+    # only on the detail pages, so each one is still revalidated (a conditional GET)
+    # once its cached copy is older than SCRAPER_REVALIDATE_HOURS.
+    SCRAPER_INCREMENTAL: bool = True
+    SCRAPER_REVALIDATE_HOURS: float = 24.0
+
+    # Periodic entity sync, 0 disables it
+    SYNC_INTERVAL_HOURS: float = 0
+    # Entities written per lookup/upsert round while a sync streams in
+    SYNC_CHUNK_SIZE: int = 50
+    # Where every complete sync writes its snapshot (gzipped JSON lines of the scraped
+    # payloads and entities); replayed with POST /sync?replay=true. Empty disables it.
+    SYNC_SNAPSHOT_PATH: str = ""
+    # Replay the snapshot at startup when the entity collection is empty, so a new
+    # node has entities before its first scrape
+    SYNC_WARM_START: bool = False
+
+    # The entity search index is reloaded in the background once it is this old
+    ENTITY_INDEX_REFRESH_SECONDS: float = 600.0
+
+    # Bearer token for the admin endpoints (/sync, /profiling). While it is empty they
+    # answer 404, and syncs only run on SYNC_INTERVAL_HOURS.
+    ADMIN_TOKEN: str = ""
+    PROFILING_DIR: str = "data/profiles"
+    PROFILING_INTERVAL_MS: float = 5.0
+    # Profiles kept on disk, oldest are removed first
+    PROFILING_KEEP: int = 50
+
+    # Optional Redis for state shared between workers, e.g. redis://localhost:6379/0
+    # (needs the `redis` extra)
+    REDIS_URL: str = ""
+    # Worker processes serving the app; uvicorn reads the same variable for --workers.
+    # With more than one and no REDIS_URL, each worker only knows its own sends, so
+    # the eligibility index has PocketBase confirm every address it would let through.
+    WEB_CONCURRENCY: int = 1
+
     MAIL_HASH_SALT: str = "default_salt"
     OTP_EXPIRY_MINUTES: int = 10
+    OTP_MAX_ATTEMPTS: int = 5
+    OTP_SWEEP_SECONDS: float = 60.0
+    # Sliding-window limits on /request-otp, shared between workers when REDIS_URL is set.
+    # Per client IP the limit counts distinct mail addresses ("one machine, many emails").
+    OTP_IP_LIMIT: int = 5
+    OTP_IP_WINDOW_SECONDS: int = 3600
+    OTP_HASH_LIMIT: int = 5
+    OTP_HASH_WINDOW_SECONDS: int = 3600
+    # Reverse proxies in front of the backend that append to X-Forwarded-For. The
+    # client IP is the address the outermost of them saw; entries to its left come
+    # from the client and can be forged. 0 uses the connection's peer address.
+    TRUSTED_PROXY_HOPS: int = 0
     RATE_LIMIT_HOURS: int = 168
+    # Repeats of /request-otp and /verify-and-send within the window replay the first
+    # result instead of sending again. The in-flight marker is refreshed while the
+    # request runs, and outlives a crashed worker for at most IDEMPOTENCY_IN_FLIGHT_SECONDS.
+    IDEMPOTENCY_WINDOW_SECONDS: float = 120.0
+    IDEMPOTENCY_IN_FLIGHT_SECONDS: float = 30.0
 
     DOMAIN_NAME: str = "example.com"
 
+    # Timeout for dependency probes made by the readiness endpoint
+    HEALTH_CHECK_TIMEOUT: float = 2.0
+
+    # Circuit breakers: after this many failed calls in a row a dependency is not
+    # called for BREAKER_RESET_SECONDS, then a single probe call decides whether it
+    # is back. The call timeouts cut off hanging calls below the clients' own timeouts.
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_SECONDS: float = 30.0
+    POCKETBASE_CALL_TIMEOUT: float = 5.0
+    SMTP_CALL_TIMEOUT: float = 15.0
+    MAILTRAP_CALL_TIMEOUT: float = 15.0
+    # Per request to parliament.bg; the scheduler's waits and retries come on top
+    SCRAPER_CALL_TIMEOUT: float = 20.0
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
@@ -0,0 +1,93 @@
+import gzip
+import hashlib
+from typing import Dict, Iterable, Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+# Bodies smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 1000
+
+
+def make_etag(*parts: object) -> str:
+    """Weak ETag over the given version markers (ids, `updated` timestamps, ...)."""
+    digest = hashlib.sha1("\x1f".join(map(str, parts)).encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+class EncodedResponse:
+    """
+    A serialized response body with its ETag and pre-compressed variants, so that
+    serving it again costs neither serialization nor compression.
+    """
+
+    __slots__ = ("body", "etag", "media_type", "variants")
+
+    def __init__(self, body: bytes, etag: str, media_type: str = "application/json") -> None:
+        self.body = body
+        self.etag = etag
+        self.media_type = media_type
+        self.variants: Dict[str, bytes] = {}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.variants["gzip"] = gzip.compress(body, compresslevel=6, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body, quality=5)
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return any(
+        tag == "*" or _opaque(tag) == _opaque(etag) for tag in _split(header)
+    )
+
+
+def respond(
+    request: Request, encoded: EncodedResponse, cache_control: str
+) -> Response:
+    """Answers with 304, or with the best encoding the client accepts."""
+    headers = {
+        "ETag": encoded.etag,
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if not_modified(request, encoded.etag):
+        return Response(status_code=304, headers=headers)
+
+    accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    for encoding in ("br", "gzip"):
+        body = encoded.variants.get(encoding)
+        if body is not None and encoding in accepted:
+            headers["Content-Encoding"] = encoding
+            return Response(body, media_type=encoded.media_type, headers=headers)
+    return Response(encoded.body, media_type=encoded.media_type, headers=headers)
+
+
+def _split(header: str) -> Iterable[str]:
+    return (part.strip() for part in header.split(",") if part.strip())
+
+
+def _opaque(tag: str) -> str:
+    # If-None-Match uses weak comparison, so the W/ prefix doesn't matter
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in _split(header):
+        name, _, params = part.partition(";")
+        quality: Optional[float] = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = None
+        if quality:
+            accepted.add(name.strip().lower())
+    return accepted
@@ -0,0 +1,173 @@
+import bisect
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# Upper bounds in seconds, wide enough for both in-process work and slow upstreams
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus sense."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        running = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            result.append((_format_float(bound), running))
+        result.append(("+Inf", self.count))
+        return result
+
+
+class Span:
+    """A timed dependency call. Set `error` to count it as failed without raising."""
+
+    __slots__ = ("error",)
+
+    def __init__(self) -> None:
+        self.error = False
+
+
+class Metrics:
+    """
+    In-process metrics registry.
+
+    Requests are recorded per route template by the HTTP middleware, and calls to
+    external dependencies (PocketBase, SMTP, Mailtrap, parliament.bg) through `span`.
+    `render` produces the Prometheus text exposition format served on `/metrics`.
+    Updates happen on the event loop, so no locking is needed.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.requests: Dict[_Labels, Histogram] = {}
+        self.request_count: Dict[_Labels, int] = defaultdict(int)
+        self.spans: Dict[_Labels, Histogram] = {}
+        self.span_errors: Dict[_Labels, int] = defaultdict(int)
+
+    def _histogram(self, family: Dict[_Labels, Histogram], labels: _Labels) -> Histogram:
+        histogram = family.get(labels)
+        if histogram is None:
+            histogram = family[labels] = Histogram(self.buckets)
+        return histogram
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        self._histogram(self.requests, (("method", method), ("route", route))).observe(
+            seconds
+        )
+        self.request_count[
+            (("method", method), ("route", route), ("status", str(status)))
+        ] += 1
+
+    @contextmanager
+    def span(self, dependency: str, operation: str) -> Iterator[Span]:
+        """
+        Times the wrapped call to `dependency`. Exceptions propagate and are
+        counted as errors, as is a span whose `error` flag was set.
+        """
+        span = Span()
+        labels = (("dependency", dependency), ("operation", operation))
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException:
+            span.error = True
+            raise
+        finally:
+            self._histogram(self.spans, labels).observe(time.perf_counter() - started)
+            if span.error:
+                self.span_errors[labels] += 1
+
+    def reset(self) -> None:
+        self.requests.clear()
+        self.request_count.clear()
+        self.spans.clear()
+        self.span_errors.clear()
+
+    def render(self) -> str:
+        lines: List[str] = []
+        _render_histogram(
+            lines,
+            "http_request_duration_seconds",
+            "HTTP request latency by route template.",
+            self.requests,
+        )
+        _render_counter(
+            lines,
+            "http_requests_total",
+            "HTTP requests by route template and status.",
+            self.request_count,
+        )
+        _render_histogram(
+            lines,
+            "dependency_call_duration_seconds",
+            "Latency of calls to external dependencies.",
+            self.spans,
+        )
+        _render_counter(
+            lines,
+            "dependency_call_errors_total",
+            "Failed calls to external dependencies.",
+            self.span_errors,
+        )
+        return "\n".join(lines) + "\n"
+
+
+def _render_histogram(
+    lines: List[str], name: str, help: str, family: Dict[_Labels, Histogram]
+) -> None:
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, histogram in sorted(family.items()):
+        for bound, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+
+def _render_counter(
+    lines: List[str], name: str, help: str, family: Dict[_Labels, int]
+) -> None:
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} counter")
+    for labels, value in sorted(family.items()):
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+
+def _format_labels(labels: _Labels) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_float(value: float) -> str:
+    return repr(float(value))
+
+
+metrics = Metrics()
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from types import CodeType, FrameType
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.api.models import ProfileFile, ProfilingConfig, ProfilingStatus
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# A frame as (function, file, first line); a stack lists them root first
+_Frame = Tuple[str, str, int]
+_Stack = Tuple[_Frame, ...]
+
+PROFILE_SUFFIXES = (".collapsed", ".speedscope.json")
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a daemon thread records the stack of one thread (by default
+    the caller's, i.e. the event loop) every `interval` seconds. The profiled code is
+    not instrumented, so the overhead is the sampling thread alone.
+
+    Everything running on the loop is sampled, so concurrent requests show up in each
+    other's profiles; time spent waiting on I/O appears under the loop's `select`.
+    """
+
+    def __init__(self, interval: float, thread_id: Optional[int] = None) -> None:
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples: Counter = Counter()
+        self.started = 0.0
+        self.duration = 0.0
+        self._labels: Dict[CodeType, _Frame] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[self._stack(frame)] += 1
+
+    def _stack(self, frame: Optional[FrameType]) -> _Stack:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                name = getattr(code, "co_qualname", code.co_name)
+                path = _short_path(code.co_filename)
+                label = self._labels[code] = (name, path, code.co_firstlineno)
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed-stack format, the input of flamegraph.pl."""
+        lines = [
+            ";".join(f"{name} ({path}:{line})" for name, path, line in stack) + f" {count}"
+            for stack, count in self.samples.most_common()
+        ]
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        """A sampled profile in the speedscope file format (https://www.speedscope.app)."""
+        frames: Dict[_Frame, int] = {}
+        samples: List[List[int]] = []
+        weights: List[float] = []
+        for stack, count in self.samples.items():
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "glas-backend",
+            "shared": {
+                "frames": [
+                    {"name": fname, "file": path, "line": line}
+                    for fname, path, line in frames
+                ]
+            },
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+
+
+class ProfilingController:
+    """
+    Runtime switch for profiling live requests, plus on-demand captures such as a
+    single sync run. Each capture is written as a collapsed-stack file and a
+    speedscope file under `directory`, keeping the newest `keep` captures.
+
+    The switch is per process: with several workers, each one has to be enabled.
+    At most one sampled request is profiled at a time, so a busy worker with a high
+    sample rate still runs a single sampling thread.
+    """
+
+    def __init__(self, directory: str, interval: float, keep: int) -> None:
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.config = ProfilingConfig(enabled=False)
+        self.until: Optional[datetime] = None
+        self.captured = 0
+        self.running = 0
+        self._request_busy = False
+
+    def configure(self, config: ProfilingConfig) -> ProfilingStatus:
+        self.config = config
+        self.until = (
+            datetime.now(timezone.utc) + timedelta(seconds=config.duration_seconds)
+            if config.enabled
+            else None
+        )
+        logger.info(f"Request profiling configured: {config.model_dump()}")
+        return self.status()
+
+    def status(self) -> ProfilingStatus:
+        return ProfilingStatus(
+            enabled=self._active(),
+            sample_rate=self.config.sample_rate,
+            route=self.config.route,
+            until=self.until,
+            captured=self.captured,
+            running=self.running,
+        )
+
+    def _active(self) -> bool:
+        if not self.config.enabled:
+            return False
+        if self.until is not None and datetime.now(timezone.utc) >= self.until:
+            self.config = self.config.model_copy(update={"enabled": False})
+            self.until = None
+            return False
+        return True
+
+    def should_profile(self, path: str) -> bool:
+        if self._request_busy or not self._active():
+            return False
+        if self.config.route:
+            return path == self.config.route
+        return random.random() < self.config.sample_rate
+
+    @asynccontextmanager
+    async def profile_request(self, method: str, path: str) -> AsyncIterator[None]:
+        self._request_busy = True
+        try:
+            async with self.capture(f"{method} {path}"):
+                yield
+        finally:
+            self._request_busy = False
+
+    @staticmethod
+    def profile_name(label: str) -> str:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        slug = re.sub(r"[^a-z0-9]+", "-", label.lower()).strip("-")[:60]
+        return f"{stamp}-{slug}-{uuid.uuid4().hex[:6]}"
+
+    @asynccontextmanager
+    async def capture(self, label: str, name: Optional[str] = None) -> AsyncIterator[str]:
+        """Profiles the block and yields the name its files are saved under."""
+        name = name or self.profile_name(label)
+        sampler = SamplingProfiler(self.interval)
+        self.running += 1
+        sampler.start()
+        try:
+            yield name
+        finally:
+            sampler.stop()
+            self.running -= 1
+            try:
+                await asyncio.to_thread(self._save, name, label, sampler)
+                self.captured += 1
+            except OSError as e:
+                logger.error(f"could not save profile {name}: {e}")
+
+    def _save(self, name: str, label: str, sampler: SamplingProfiler) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, name)
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            f.write(sampler.collapsed())
+        with open(base + ".speedscope.json", "w", encoding="utf-8") as f:
+            json.dump(sampler.speedscope(label), f)
+        logger.info(
+            f"Saved profile {name}: {sum(sampler.samples.values())} samples "
+            f"over {sampler.duration:.3f}s"
+        )
+        self._prune()
+
+    def _prune(self) -> None:
+        names = sorted({_profile_name(f) for f in self._files()})
+        for name in names[: max(0, len(names) - self.keep)]:
+            for suffix in PROFILE_SUFFIXES:
+                try:
+                    os.remove(os.path.join(self.directory, name + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def _files(self) -> List[str]:
+        try:
+            entries = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [e for e in entries if e.endswith(PROFILE_SUFFIXES)]
+
+    def list_files(self) -> List[ProfileFile]:
+        files = []
+        for filename in sorted(self._files(), reverse=True):
+            stat = os.stat(os.path.join(self.directory, filename))
+            files.append(
+                ProfileFile(
+                    name=filename,
+                    size=stat.st_size,
+                    created=datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+                )
+            )
+        return files
+
+    def file_path(self, filename: str) -> Optional[str]:
+        """Path of a saved profile file, or None for anything that isn't one."""
+        if filename not in self._files():
+            return None
+        return os.path.join(self.directory, filename)
+
+
+def _profile_name(filename: str) -> str:
+    for suffix in PROFILE_SUFFIXES:
+        if filename.endswith(suffix):
+            return filename[: -len(suffix)]
+    return filename
+
+
+def _short_path(filename: str) -> str:
+    marker = f"site-packages{os.sep}"
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    try:
+        relative = os.path.relpath(filename)
+    except ValueError:
+        return filename
+    return filename if relative.startswith("..") else relative
+
+
+profiler = ProfilingController(
+    settings.PROFILING_DIR,
+    interval=settings.PROFILING_INTERVAL_MS / 1000,
+    keep=settings.PROFILING_KEEP,
+)
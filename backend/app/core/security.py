@@ -1,4 +1,7 @@
 import hashlib
+import secrets
+from typing import Optional
+from fastapi import Header, HTTPException, Request
 from app.core.config import settings
 
 
@@ -6,3 +9,32 @@ def hash_email(email: str) -> str:
     """Hashes the email with a salt for privacy and abuse prevention."""
     salted_email = f"{email}{settings.MAIL_HASH_SALT}"
     return hashlib.sha256(salted_email.encode()).hexdigest()
+
+
+def client_ip(request: Request) -> str:
+    """
+    The originating client address. Behind `TRUSTED_PROXY_HOPS` proxies, it is the
+    X-Forwarded-For entry appended by the outermost one, counted from the right.
+    """
+    peer = request.client.host if request.client else "unknown"
+    hops = settings.TRUSTED_PROXY_HOPS
+    if hops <= 0:
+        return peer
+    forwarded = request.headers.get("x-forwarded-for", "")
+    chain = [a.strip() for a in forwarded.split(",") if a.strip()] + [peer]
+    return chain[max(0, len(chain) - 1 - hops)]
+
+
+def require_admin(authorization: Optional[str] = Header(default=None)) -> None:
+    """Dependency for admin-only endpoints: `Authorization: Bearer <ADMIN_TOKEN>`."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(
+        token.encode(), settings.ADMIN_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid admin token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
@@ -1,11 +1,108 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.api import admin, health
 from app.api.endpoints import router
 from app.services.entity_maintainer import entity_maintainer
+from app.core.config import settings
+from app.core.http_cache import MIN_COMPRESS_SIZE
+from app.core.metrics import metrics
+from app.core.profiling import profiler
+from app.services.cache import RealtimeInvalidator
+from app.services.circuit_breaker import DependencyUnavailable
+from app.services.eligibility import eligibility
+from app.services.entity_index import entity_index
+from app.services.mail_service import mail_sender
+from app.services.otp_store import auth_audit, otp_sweeper
+from app.services.outbox import outbox, outbox_workers
+from app.services.pb_service import pb
+from app.services.shared_state import get_redis
+from app.services.sync_jobs import sync_runner
+from app.services.template_manager import CACHED_COLLECTIONS, template_manager
 
-app = FastAPI(title="Glas Mail Sender API")
+logger = logging.getLogger(__name__)
 
 
+async def _warm_eligibility():
+    try:
+        await eligibility.warm()
+    except Exception as e:
+        logger.error(f"could not warm the eligibility index, using PocketBase: {e}")
+
+
+def _warn_about_configuration() -> None:
+    if not settings.ADMIN_TOKEN:
+        logger.warning(
+            "ADMIN_TOKEN is not set: the /sync and /profiling admin endpoints are disabled"
+        )
+    if settings.WEB_CONCURRENCY > 1 and not settings.REDIS_URL:
+        logger.warning(
+            f"{settings.WEB_CONCURRENCY} workers without REDIS_URL: OTP codes, rate limits "
+            "and the eligibility index are per worker, and every eligible send is "
+            "confirmed against PocketBase"
+        )
+    if settings.TRUSTED_PROXY_HOPS == 0:
+        logger.warning(
+            "TRUSTED_PROXY_HOPS is 0: client IPs are the connection's peer address. Behind "
+            "a reverse proxy every client shares the proxy's address, and OTP_IP_LIMIT "
+            "throttles them together; set it to the number of proxies in front"
+        )
+
+
+def _invalidate_caches(collection: str) -> None:
+    template_manager.invalidate(collection)
+    entity_index.invalidate(collection)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Only local setup happens here; PocketBase and the mail provider are contacted
+    # on first use, so a slow dependency can't hold up startup.
+    _warn_about_configuration()
+    pb.open()
+    mail_sender.open()
+    invalidator = None
+    if settings.PB_REALTIME_INVALIDATION:
+        invalidator = RealtimeInvalidator(
+            pb, CACHED_COLLECTIONS, _invalidate_caches
+        )
+        invalidator.start()
+    warm_task = asyncio.create_task(_warm_eligibility())
+    auth_audit.start()
+    otp_sweeper.start(settings.OTP_SWEEP_SECONDS)
+    outbox.open()
+    outbox_workers.start(settings.OUTBOX_WORKERS)
+    if settings.SYNC_WARM_START and settings.SYNC_SNAPSHOT_PATH:
+        sync_runner.warm_start(settings.SYNC_SNAPSHOT_PATH)
+    sync_runner.start_schedule(settings.SYNC_INTERVAL_HOURS)
+    yield
+    await sync_runner.stop()
+    warm_task.cancel()
+    await outbox_workers.stop()
+    outbox.close()
+    await otp_sweeper.stop()
+    await auth_audit.stop()
+    await mail_sender.aclose()
+    if invalidator is not None:
+        await invalidator.stop()
+    await entity_maintainer.aclose()
+    await pb.aclose()
+    if settings.REDIS_URL:
+        await get_redis().aclose()
+
+
+app = FastAPI(title="Glas Mail Sender API", lifespan=lifespan)
+
+
+# Responses that are already encoded (the cached template list) pass through untouched
+app.add_middleware(GZipMiddleware, minimum_size=MIN_COMPRESS_SIZE)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Adjust in production
@@ -14,14 +111,56 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template so path parameters don't explode the series count
+        route = request.scope.get("route")
+        metrics.observe_request(
+            request.method,
+            getattr(route, "path", "unmatched"),
+            status,
+            time.perf_counter() - started,
+        )
+
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    # Off unless enabled through the admin profiling endpoint
+    if not profiler.should_profile(request.url.path):
+        return await call_next(request)
+    async with profiler.profile_request(request.method, request.url.path):
+        return await call_next(request)
+
+
+@app.exception_handler(DependencyUnavailable)
+async def dependency_unavailable(request: Request, exc: DependencyUnavailable):
+    # Shed the request right away instead of letting it wait on a dead dependency
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"{exc.dependency} is temporarily unavailable"},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+
 app.include_router(router, prefix="/api")
+app.include_router(admin.router)
+app.include_router(health.router)
 
 
 @app.get("/")
 async def root():
-    return {"status": "ok", "message": "Glas Mail Sender API is running"}
+    return await health.readiness()
 
 
-@app.get("/sync")
-async def sync():
-    await entity_maintainer.run_full_sync()
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,9 +1,14 @@
+import hmac
+import logging
 import random
+import time
 from typing import Tuple
-from datetime import datetime, timedelta, timezone
-from app.services.pb_service import pb
+from datetime import datetime, timezone
 from app.core.config import settings
 from app.api.models import AuthAttempt, AuthState
+from app.services.otp_store import auth_audit, new_record_id, otp_store, OTPEntry
+
+logger = logging.getLogger(__name__)
 
 
 class Authenticator:
@@ -14,60 +19,55 @@ class Authenticator:
     @staticmethod
     async def create_auth_session(mail_hash: str) -> Tuple[AuthAttempt, int]:
         code = Authenticator.generate_code()
-        expires = datetime.now(timezone.utc) + timedelta(
-            minutes=settings.OTP_EXPIRY_MINUTES
-        )
+        expires = time.time() + settings.OTP_EXPIRY_MINUTES * 60
+
+        entry = OTPEntry(attempt_id=new_record_id(), code=code, expires=expires)
+        previous = await otp_store.put(mail_hash, entry)
+
+        # The PB audit trail is written in the background
+        auth_audit.created(entry.attempt_id, mail_hash, code, expires)
+        if previous is not None:
+            # A newer code supersedes the old one
+            auth_audit.state_changed(previous.attempt_id, AuthState.EXPIRED)
 
-        # Store in PB
-        data = {
-            "user_mail_hash": mail_hash,
-            "code": code,
-            "expires": expires.isoformat(),
-            "state": AuthState.SENT,
-        }
-        record = pb.collection("auth_attempt").create(data)
-        return AuthAttempt.model_validate(record), code
+        attempt = AuthAttempt(
+            id=entry.attempt_id,
+            user_mail_hash=mail_hash,
+            code=code,
+            expires=datetime.fromtimestamp(expires, timezone.utc),
+            state=AuthState.SENT,
+        )
+        return attempt, code
 
     @staticmethod
     async def verify_code(mail_hash: str, code: int) -> bool:
-        # Fetch the latest attempt for this mail_hash
-        try:
-            results = pb.collection("auth_attempt").get_list(
-                1,
-                1,
-                query_params={
-                    "filter": f'user_mail_hash = "{mail_hash}" && state = "{AuthState.SENT.value}"',
-                    "sort": "-created",
-                },
-            )
-
-            if not results.items:
-                print("could not fetch any codes")
-                return False
+        entry = await otp_store.get(mail_hash)
+        if entry is None:
+            logger.debug("could not fetch any codes")
+            return False
 
-            attempt_record = results.items[0]
-            attempt = AuthAttempt.model_validate(attempt_record)
+        # Check expiry
+        if time.time() > entry.expires:
+            logger.debug("code is expired")
+            await otp_store.delete(mail_hash)
+            auth_audit.state_changed(entry.attempt_id, AuthState.EXPIRED)
+            return False
 
-            # Check expiry
-            if datetime.now(timezone.utc) > attempt.expires:
-                print(f"code is expred :{attempt.code} expected: {code}")
-                pb.collection("auth_attempt").update(
-                    attempt.id,  # pyright: ignore[reportArgumentType]
-                    {"state": AuthState.EXPIRED},
-                )
+        if hmac.compare_digest(str(entry.code), str(code)):
+            # A code verifies once: of concurrent verifications only one consumes it
+            if not await otp_store.consume(mail_hash, entry.attempt_id):
+                logger.debug("code was already used")
                 return False
+            auth_audit.state_changed(entry.attempt_id, AuthState.SUCCESS)
+            return True
 
-            if attempt.code == code:
-                pb.collection("auth_attempt").update(
-                    attempt.id,  # pyright: ignore[reportArgumentType]
-                    {"state": AuthState.SUCCESS},
-                )
-                return True
-            else:
-                print(f"codes do not match received:{attempt.code} expected: {code}")
-                return False
-        except Exception as e:
-            raise e
+        attempts = await otp_store.incr_attempts(mail_hash)
+        logger.debug(f"codes do not match, attempt {attempts}/{settings.OTP_MAX_ATTEMPTS}")
+        if attempts >= settings.OTP_MAX_ATTEMPTS:
+            # Lock the code out; the user has to request a new one
+            await otp_store.delete(mail_hash)
+            auth_audit.state_changed(entry.attempt_id, AuthState.FAILED)
+        return False
 
 
 authenticator = Authenticator()
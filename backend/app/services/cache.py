@@ -0,0 +1,178 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Generic, Iterable, Optional, Tuple, TypeVar
+
+from app.services.pb_service import PBClient
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class VersionedCache(Generic[T]):
+    """
+    In-process TTL cache whose entries are stamped with a global version.
+    `invalidate()` bumps the version, which makes every existing entry stale at once
+    without having to walk the keys. Concurrent misses for the same key share one load.
+
+    The last value loaded for each key is kept past expiry and invalidation: when a
+    load fails with an error `fallback` accepts (an outage of the source), that
+    last-known-good value is served instead.
+    """
+
+    def __init__(
+        self, ttl: float, fallback: Optional[Callable[[BaseException], bool]] = None
+    ) -> None:
+        self.ttl = ttl
+        self.version = 0
+        self.fallback = fallback
+        self._entries: Dict[str, Tuple[T, float, int]] = {}
+        self._last_good: Dict[str, T] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    def get(self, key: str) -> Optional[T]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at, version = entry
+        if version != self.version or time.monotonic() > expires_at:
+            self._entries.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: str, value: T) -> None:
+        self._entries[key] = (value, time.monotonic() + self.ttl, self.version)
+        if self.fallback is not None:
+            self._last_good[key] = value
+
+    def last_good(self, key: str) -> Optional[T]:
+        return self._last_good.get(key)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[T]]) -> T:
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        pending = self._loading.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        version = self.version
+        try:
+            value, fresh = await self._load(key, loader)
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody may be awaiting the future; mark the exception as retrieved.
+            future.exception()
+            raise
+        finally:
+            self._loading.pop(key, None)
+
+        # Don't store a value that was loaded across an invalidation, nor a stale one,
+        # so the next miss tries the source again
+        if fresh and version == self.version:
+            self.set(key, value)
+        future.set_result(value)
+        return value
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """The loaded value and True, or the last known good one and False."""
+        try:
+            return await loader(), True
+        except Exception as e:
+            if self.fallback is None or key not in self._last_good or not self.fallback(e):
+                raise
+            logger.info(f"serving last known good {key!r} after a failed load: {e}")
+            return self._last_good[key], False
+
+    def invalidate(self, keys: Optional[Iterable[str]] = None) -> None:
+        if keys is None:
+            self.version += 1
+            self._entries.clear()
+            return
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+class RealtimeInvalidator:
+    """
+    Subscribes to PocketBase realtime events for the given collections and calls
+    `on_change` for every create/update/delete, so cached reads are dropped as soon as
+    an admin edits a record instead of waiting for the TTL.
+    """
+
+    def __init__(
+        self,
+        client: PBClient,
+        collections: Iterable[str],
+        on_change: Callable[[str], None],
+        retry_delay: float = 5.0,
+    ) -> None:
+        self.client = client
+        self.collections = list(collections)
+        self.on_change = on_change
+        self.retry_delay = retry_delay
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"realtime subscription dropped: {e}")
+            # Events may have been missed while disconnected
+            for collection in self.collections:
+                self.on_change(collection)
+            await asyncio.sleep(self.retry_delay)
+
+    async def _listen(self) -> None:
+        async with self.client.open().stream(
+            "GET", "/api/realtime", timeout=None
+        ) as response:
+            response.raise_for_status()
+            event: Optional[str] = None
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[len("event:") :].strip()
+                elif line.startswith("data:") and event is not None:
+                    await self._handle(event, line[len("data:") :].strip())
+                elif not line:
+                    event = None
+
+    async def _handle(self, event: str, data: str) -> None:
+        if event == "PB_CONNECT":
+            client_id = json.loads(data)["clientId"]
+            await self.client.request(
+                "POST",
+                "/api/realtime",
+                json={
+                    "clientId": client_id,
+                    "subscriptions": [f"{c}/*" for c in self.collections],
+                },
+            )
+            logger.info(f"subscribed to realtime changes for {self.collections}")
+            return
+
+        collection = event.split("/", 1)[0]
+        if collection in self.collections:
+            self.on_change(collection)
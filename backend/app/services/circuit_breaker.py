@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from app.api.models import CircuitState
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DependencyUnavailable(Exception):
+    """A dependency was not called, or didn't answer in time. Maps to a 503."""
+
+    def __init__(self, dependency: str, reason: str, retry_after: float) -> None:
+        super().__init__(f"{dependency} is unavailable: {reason}")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(DependencyUnavailable):
+    """The breaker is open, so the call was refused without touching the dependency."""
+
+
+class Attempt:
+    """A guarded call. Set `failed` to count it as failed without raising."""
+
+    __slots__ = ("failed",)
+
+    def __init__(self) -> None:
+        self.failed = False
+
+
+class CircuitBreaker:
+    """
+    Per-dependency circuit breaker.
+
+    Closed: calls go through, under `timeout` if one is set. After `failure_threshold`
+    failures in a row the breaker opens and refuses calls for `reset_timeout` seconds,
+    so callers fail in microseconds instead of queueing on a dead dependency. Then it
+    is half-open: one probe call is let through, and its outcome closes the breaker
+    or opens it again. Exceptions count as failures unless `is_failure` says otherwise
+    (e.g. a rejected recipient says nothing about the server's health).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_timeout: float,
+        timeout: Optional[float] = None,
+        is_failure: Optional[Callable[[BaseException], bool]] = None,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timeout = timeout
+        self.is_failure = is_failure or (lambda e: True)
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def current_state(self) -> CircuitState:
+        """The state the next call would see."""
+        if self.state == CircuitState.OPEN and (
+            time.monotonic() - self._opened_at >= self.reset_timeout
+        ):
+            return CircuitState.HALF_OPEN
+        return self.state
+
+    def _admit(self) -> bool:
+        """Lets the call through or raises. Returns True for a half-open probe."""
+        if self.state == CircuitState.CLOSED:
+            return False
+        waited = time.monotonic() - self._opened_at
+        if self.state == CircuitState.OPEN and waited >= self.reset_timeout:
+            self.state = CircuitState.HALF_OPEN
+        if self.state == CircuitState.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        raise CircuitOpenError(
+            self.name, f"circuit {self.state.value}", max(1.0, self.reset_timeout - waited)
+        )
+
+    def _record(self, ok: bool, probe: bool) -> None:
+        if probe:
+            self._probing = False
+        if ok:
+            if self.state != CircuitState.CLOSED:
+                logger.info(f"circuit for {self.name} closed")
+            self.state = CircuitState.CLOSED
+            self.failures = 0
+            return
+        self.failures += 1
+        if probe or self.failures >= self.failure_threshold:
+            if self.state != CircuitState.OPEN:
+                logger.warning(
+                    f"circuit for {self.name} opened after {self.failures} failures"
+                )
+            self.state = CircuitState.OPEN
+            self._opened_at = time.monotonic()
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[Attempt]:
+        """
+        Runs the wrapped call through the breaker. Raises `CircuitOpenError` without
+        running it while open, and `DependencyUnavailable` when it exceeds `timeout`.
+        """
+        probe = self._admit()
+        attempt = Attempt()
+        deadline = asyncio.timeout(self.timeout)
+        try:
+            async with deadline:
+                yield attempt
+        except TimeoutError as e:
+            expired = deadline.expired()
+            self._record(not expired and not self.is_failure(e), probe)
+            if not expired:
+                raise
+            raise DependencyUnavailable(
+                self.name, f"no answer within {self.timeout}s", self.reset_timeout
+            ) from e
+        except Exception as e:
+            self._record(not self.is_failure(e), probe)
+            raise
+        except BaseException:
+            # Cancelled: says nothing about the dependency, just free the probe slot
+            if probe:
+                self._probing = False
+            raise
+        else:
+            self._record(not attempt.failed, probe)
+
+
+breakers: Dict[str, CircuitBreaker] = {}
+
+
+def circuit_breaker(
+    name: str,
+    timeout: Optional[float] = None,
+    is_failure: Optional[Callable[[BaseException], bool]] = None,
+) -> CircuitBreaker:
+    """The process-wide breaker for `name`, created with the configured thresholds."""
+    breaker = breakers.get(name)
+    if breaker is None:
+        breaker = breakers[name] = CircuitBreaker(
+            name,
+            failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.BREAKER_RESET_SECONDS,
+            timeout=timeout,
+            is_failure=is_failure,
+        )
+    return breaker
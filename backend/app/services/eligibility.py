@@ -0,0 +1,156 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Set, Tuple
+
+from app.api.models import Eligibility
+from app.core.config import settings
+from app.services.pb_repository import repository
+from app.services.shared_state import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryEligibilityStore:
+    """Per-process store: mail_hash -> (last send timestamp, sent template ids)."""
+
+    shared = False
+
+    def __init__(self) -> None:
+        self._records: Dict[str, Tuple[float, Set[str]]] = {}
+
+    async def get(self, mail_hash: str) -> Tuple[Optional[float], Set[str]]:
+        record = self._records.get(mail_hash)
+        if record is None:
+            return None, set()
+        return record
+
+    async def add(self, mail_hash: str, template_id: str, sent_at: float) -> None:
+        last, templates = self._records.get(mail_hash, (sent_at, set()))
+        templates.add(template_id)
+        self._records[mail_hash] = (max(last, sent_at), templates)
+
+
+class RedisEligibilityStore:
+    """
+    Store shared between workers. Each mail_hash is a single Redis hash whose
+    `last` field holds the last send time and `t:<template_id>` fields mark sent templates.
+    Any client exposing the `redis.asyncio` API (including fakeredis) can be passed in.
+    """
+
+    shared = True
+
+    def __init__(self, client: Any, prefix: str = "eligibility:") -> None:
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, mail_hash: str) -> Tuple[Optional[float], Set[str]]:
+        fields = await self.client.hgetall(self.prefix + mail_hash)
+        last: Optional[float] = None
+        templates: Set[str] = set()
+        for key, value in fields.items():
+            key = _decode(key)
+            if key == "last":
+                last = float(_decode(value))
+            elif key.startswith("t:"):
+                templates.add(key[2:])
+        return last, templates
+
+    async def add(self, mail_hash: str, template_id: str, sent_at: float) -> None:
+        key = self.prefix + mail_hash
+
+        # WATCH/MULTI, so a concurrent add of a later send can't be overwritten
+        async def update(pipe: Any) -> None:
+            last = await pipe.hget(key, "last")
+            mapping: Dict[str, Any] = {"t:" + template_id: 1}
+            if last is None or sent_at > float(_decode(last)):
+                mapping["last"] = sent_at
+            pipe.multi()
+            pipe.hset(key, mapping=mapping)
+
+        await self.client.transaction(update, key)
+
+
+def _decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class EligibilityIndex:
+    """
+    Answers "may this mail_hash send this template?" with a single store lookup.
+
+    The index is warmed from `sent_mail_logs` at startup and updated on every
+    logged send. Until warming finishes, checks fall back to PocketBase queries.
+    Warming only adds to the store: with Redis, other workers keep answering from
+    it while this one starts, so it must never be emptied underneath them.
+
+    A store that isn't `shared` misses sends made by other workers, so unless it
+    is `authoritative` (a single worker) it can only refuse; an address it would
+    let through is checked against PocketBase as well.
+    """
+
+    def __init__(self, store: Any, authoritative: bool) -> None:
+        self.store = store
+        self.authoritative = authoritative
+        self.ready = False
+
+    async def warm(self) -> None:
+        started = time.perf_counter()
+        logs = await repository.get_sent_logs()
+        for log in logs:
+            sent_at = log.created.timestamp() if log.created else time.time()
+            await self.store.add(log.user_mail_hash, log.template_id, sent_at)
+        self.ready = True
+        logger.info(
+            f"eligibility index warmed with {len(logs)} sends in {time.perf_counter() - started:.2f}s"
+        )
+
+    async def check(self, mail_hash: str, template_id: str) -> Eligibility:
+        if not self.ready:
+            return await self._check_pb(mail_hash, template_id)
+
+        last, templates = await self.store.get(mail_hash)
+        window = settings.RATE_LIMIT_HOURS * 3600
+        if last is not None and time.time() - last < window:
+            return Eligibility.RATE_LIMITED
+        if template_id in templates:
+            return Eligibility.DUPLICATE
+        if not self.authoritative:
+            return await self._check_pb(mail_hash, template_id)
+        return Eligibility.ELIGIBLE
+
+    async def has_sent(self, mail_hash: str, template_id: str) -> bool:
+        """True if the index already knows about a logged send of this pair."""
+        if not self.ready:
+            return False
+        _, templates = await self.store.get(mail_hash)
+        return template_id in templates
+
+    async def record(
+        self, mail_hash: str, template_id: str, sent_at: Optional[datetime] = None
+    ) -> None:
+        timestamp = sent_at.timestamp() if sent_at else time.time()
+        await self.store.add(mail_hash, template_id, timestamp)
+
+    @staticmethod
+    async def _check_pb(mail_hash: str, template_id: str) -> Eligibility:
+        limit_time = datetime.now(timezone.utc) - timedelta(
+            hours=settings.RATE_LIMIT_HOURS
+        )
+        if await repository.has_sent_since(mail_hash, limit_time):
+            return Eligibility.RATE_LIMITED
+        if await repository.has_sent_template(mail_hash, template_id):
+            return Eligibility.DUPLICATE
+        return Eligibility.ELIGIBLE
+
+
+def get_eligibility_store() -> Any:
+    if not settings.REDIS_URL:
+        return MemoryEligibilityStore()
+    return RedisEligibilityStore(get_redis())
+
+
+_store = get_eligibility_store()
+eligibility = EligibilityIndex(
+    _store, authoritative=_store.shared or settings.WEB_CONCURRENCY <= 1
+)
@@ -0,0 +1,226 @@
+import asyncio
+import bisect
+import logging
+import math
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+from app.api.models import Entity, EntityPage, EntityType
+from app.core.config import settings
+from app.services.pb_repository import repository
+
+logger = logging.getLogger(__name__)
+
+# Bulgarian Streamlined System, so that "иван" and "ivan" find the same entities
+_TRANSLITERATION = str.maketrans(
+    {
+        "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ж": "zh",
+        "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n",
+        "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f",
+        "х": "h", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sht", "ъ": "a",
+        "ь": "y", "ю": "yu", "я": "ya",
+    }
+)
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase Latin form of `text`: Cyrillic transliterated, accents dropped."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return text.translate(_TRANSLITERATION)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(normalize(text))
+
+
+def _entity_tokens(entity: Entity) -> FrozenSet[str]:
+    # The mailbox name is searchable too, e.g. "budget" for budget@parliament.bg
+    return frozenset(tokenize(entity.name) + tokenize(entity.email.split("@", 1)[0]))
+
+
+def entity_key(entity: Entity) -> Tuple[str, str, str, str]:
+    """The fields sync owns; two entities with equal keys need no write."""
+    return (entity.name, entity.email, entity.ent_type.value, entity.ent_source)
+
+
+class EntityIndex:
+    """
+    In-memory search index over all entities.
+
+    Names are normalized to Latin tokens; each query token must be a prefix of one of
+    an entity's tokens. The distinct tokens are kept sorted, so a prefix maps to a
+    contiguous range found by binary search (a flattened trie), and each token posts
+    the ids of the entities that contain it.
+
+    The first search loads every entity from PocketBase. After that, syncs replace
+    the types they wrote through `refresh`, which re-indexes only the entities that
+    changed, and an index older than `ENTITY_INDEX_REFRESH_SECONDS` is reloaded in
+    the background while the current one keeps serving.
+    """
+
+    def __init__(self, max_age: float) -> None:
+        self.max_age = max_age
+        self.entities: Dict[str, Entity] = {}
+        self.loaded_at: Optional[float] = None
+        self._keys: Dict[str, Tuple[str, str, str, str]] = {}
+        self._tokens: Dict[str, FrozenSet[str]] = {}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._sorted: List[str] = []
+        self._dirty = False
+        self._order: Dict[str, Tuple[str, str]] = {}
+        self._loading: Optional[asyncio.Future] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    # --- maintenance ---
+
+    def replace(
+        self, entities: Iterable[Entity], ent_types: Optional[Sequence[EntityType]] = None
+    ) -> int:
+        """
+        Makes the index hold exactly `entities` for `ent_types` (default: all types).
+        Returns how many entries were added, changed or removed.
+        """
+        types = set(ent_types) if ent_types is not None else None
+        incoming = {e.id: e for e in entities if e.id is not None}
+        changes = 0
+        for entity_id in [
+            i for i, e in self.entities.items()
+            if (types is None or e.ent_type in types) and i not in incoming
+        ]:
+            self._remove(entity_id)
+            changes += 1
+        for entity_id, entity in incoming.items():
+            key = entity_key(entity)
+            if self._keys.get(entity_id) == key:
+                continue
+            self._remove(entity_id)
+            self._add(entity_id, entity, key)
+            changes += 1
+        self.loaded_at = time.monotonic()
+        return changes
+
+    def _add(self, entity_id: str, entity: Entity, key: Tuple[str, str, str, str]) -> None:
+        tokens = _entity_tokens(entity)
+        self.entities[entity_id] = entity
+        self._keys[entity_id] = key
+        self._tokens[entity_id] = tokens
+        self._order[entity_id] = (entity.name.casefold(), entity_id)
+        for token in tokens:
+            postings = self._postings[token]
+            if not postings:
+                self._dirty = True
+            postings.add(entity_id)
+
+    def _remove(self, entity_id: str) -> None:
+        if self.entities.pop(entity_id, None) is None:
+            return
+        del self._keys[entity_id]
+        del self._order[entity_id]
+        for token in self._tokens.pop(entity_id):
+            postings = self._postings[token]
+            postings.discard(entity_id)
+            if not postings:
+                del self._postings[token]
+                self._dirty = True
+
+    def _sorted_tokens(self) -> List[str]:
+        if self._dirty:
+            self._sorted = sorted(self._postings)
+            self._dirty = False
+        return self._sorted
+
+    async def load(self) -> None:
+        """(Re)loads every entity from PocketBase. Concurrent callers share one load."""
+        if self._loading is not None:
+            return await asyncio.shield(self._loading)
+        self._loading = asyncio.get_running_loop().create_future()
+        try:
+            changes = self.replace(await repository.get_entities())
+        except BaseException as e:
+            self._loading.set_exception(e)
+            # Nobody may be awaiting the future; mark the exception as retrieved.
+            self._loading.exception()
+            raise
+        else:
+            self._loading.set_result(None)
+        finally:
+            self._loading = None
+        logger.info(f"entity index loaded: {len(self.entities)} entities, {changes} changed")
+
+    async def refresh(self, ent_types: Sequence[EntityType]) -> None:
+        """Re-reads `ent_types` from PocketBase, e.g. after a sync wrote them."""
+        if self.loaded_at is None:
+            return  # Loaded in full on first use anyway
+        changes = self.replace(await repository.get_entities(ent_types), ent_types)
+        logger.info(f"entity index refreshed for {[t.value for t in ent_types]}: {changes} changed")
+
+    def invalidate(self, collection: Optional[str] = None) -> None:
+        """Marks the index stale, so the next search reloads it in the background."""
+        if collection in (None, "entity") and self.loaded_at is not None:
+            self.loaded_at = -math.inf
+
+    async def _ensure_loaded(self) -> None:
+        if self.loaded_at is None:
+            await self.load()
+        elif time.monotonic() - self.loaded_at > self.max_age and self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._background_reload())
+
+    async def _background_reload(self) -> None:
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(f"could not reload the entity index, serving the old one: {e}")
+        finally:
+            self._refresh_task = None
+
+    # --- queries ---
+
+    def _prefix_matches(self, prefix: str) -> Set[str]:
+        tokens = self._sorted_tokens()
+        matches: Set[str] = set()
+        start = bisect.bisect_left(tokens, prefix)
+        for token in tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            matches |= self._postings[token]
+        return matches
+
+    def _match(self, query: str, ent_types: Sequence[EntityType]) -> List[str]:
+        ids: Optional[Set[str]] = None
+        # Longest tokens first, they have the fewest matches to intersect
+        for token in sorted(set(tokenize(query)), key=len, reverse=True):
+            matches = self._prefix_matches(token)
+            ids = matches if ids is None else ids & matches
+            if not ids:
+                return []
+        candidates: Iterable[str] = self.entities if ids is None else ids
+        if ent_types:
+            types = set(ent_types)
+            candidates = [i for i in candidates if self.entities[i].ent_type in types]
+        return sorted(candidates, key=self._order.__getitem__)
+
+    async def search(
+        self,
+        query: str = "",
+        ent_types: Sequence[EntityType] = (),
+        page: int = 1,
+        per_page: int = 30,
+    ) -> EntityPage:
+        await self._ensure_loaded()
+        ids = self._match(query, ent_types)
+        start = (page - 1) * per_page
+        return EntityPage(
+            page=page,
+            per_page=per_page,
+            total_items=len(ids),
+            total_pages=math.ceil(len(ids) / per_page),
+            items=[self.entities[i] for i in ids[start : start + per_page]],
+        )
+
+
+entity_index = EntityIndex(settings.ENTITY_INDEX_REFRESH_SECONDS)
@@ -1,14 +1,49 @@
 import asyncio
-from itertools import zip_longest
+from collections import Counter
+from itertools import islice, zip_longest
 import logging
+import re
+import time
 import httpx
-from typing import List, Any, Mapping, Optional, TypedDict
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    TypedDict,
+    Union,
+)
 
 from pydantic import BaseModel, Field, HttpUrl, EmailStr
 
-from app.api.models import Entity, EntityType
-
-from app.services.pb_service import pb
+from app.api.models import Entity, EntityType, SyncProgress, SyncReport
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.circuit_breaker import (
+    CircuitOpenError,
+    DependencyUnavailable,
+    circuit_breaker,
+)
+
+from app.services.entity_index import entity_index, entity_key
+from app.services.entity_snapshot import read_snapshot, write_snapshot
+from app.services.pb_repository import repository
+from app.services.response_cache import (
+    CachedResponse,
+    ResponseCache,
+    content_hash,
+    item_hash,
+)
+from app.services.scrape_scheduler import AdaptiveScheduler
+from app.services.template_manager import template_manager
 
 logger = logging.getLogger(__name__)
 
@@ -40,22 +75,120 @@ class EntityMaintainer:
     """
 
     def __init__(self) -> None:
-        # INFO: So, the httpx library sets a User-Agent that triggers the parliament.bg defences. So we replace it.
-        headers = {
-            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Accept": "application/json",
-        }
         self.base_url = "https://parliament.bg/api/v1"
-        self.client = httpx.AsyncClient(
-            base_url=self.base_url, timeout=30.0, verify=False, headers=headers
+        # Created on first fetch, so importing the module does no I/O setup
+        self.client: Optional[httpx.AsyncClient] = None
+        # Shared by every fetcher so the whole sync respects one upstream budget
+        self.scheduler = AdaptiveScheduler(
+            max_concurrency=settings.SCRAPER_MAX_CONCURRENCY,
+            initial_rate=settings.SCRAPER_INITIAL_RATE,
+            min_rate=settings.SCRAPER_MIN_RATE,
+            max_rate=settings.SCRAPER_MAX_RATE,
+            latency_threshold=settings.SCRAPER_LATENCY_THRESHOLD,
+            max_retries=settings.SCRAPER_MAX_RETRIES,
         )
-
-    async def _fetch(self, endpoint: str) -> Optional[Any]:
-        """Generic async fetcher with error handling"""
+        self.cache = ResponseCache(settings.SCRAPER_CACHE_DIR)
+        # Wraps each request the scheduler sends, not its waits for tokens, slots or backoff
+        self.breaker = circuit_breaker(
+            "parliament",
+            timeout=settings.SCRAPER_CALL_TIMEOUT,
+            is_failure=lambda e: isinstance(e, httpx.TransportError),
+        )
+        self.incremental = settings.SCRAPER_INCREMENTAL
+        self.revalidate_after = settings.SCRAPER_REVALIDATE_HOURS * 3600
+        self.fetch_stats: Counter[str] = Counter()
+        self.progress: Dict[str, SyncProgress] = {}
+        # Endpoints fetched by the running sync, in order, for its snapshot
+        self._fetched: Dict[str, None] = {}
+
+    def open(self) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            # INFO: So, the httpx library sets a User-Agent that triggers the parliament.bg defences. So we replace it.
+            headers = {
+                "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+                "Accept": "application/json",
+            }
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url, timeout=30.0, verify=False, headers=headers
+            )
+        return self.client
+
+    async def _get(self, endpoint: str, headers: Dict[str, str]) -> httpx.Response:
+        with metrics.span("parliament", _endpoint_label(endpoint)) as span:
+            response = await self.open().get(endpoint, headers=headers)
+            span.error = response.status_code == 429 or response.is_server_error
+        return response
+
+    async def _guarded_get(self, endpoint: str, headers: Dict[str, str]) -> httpx.Response:
+        async with self.breaker.guard() as attempt:
+            response = await self._get(endpoint, headers)
+            attempt.failed = response.status_code == 429 or response.is_server_error
+        return response
+
+    async def _fetch(
+        self, endpoint: str, source: Optional[Mapping] = None
+    ) -> Optional[Any]:
+        """
+        Generic async fetcher with error handling.
+
+        Requests carry the cached ETag/Last-Modified validators, and a payload whose hash
+        matches the cached one is not decoded again. `source` is the list entry a detail
+        page belongs to: in incremental mode an unchanged entry is answered from the
+        cache without a request at all, until the copy is `SCRAPER_REVALIDATE_HOURS`
+        old (the list entry doesn't carry the email). While parliament.bg is unavailable (open
+        breaker or timeout) the cached copy is returned as well.
+        """
+        self._fetched[endpoint] = None
+        cached = await self.cache.get(endpoint)
+        source_hash = item_hash(source) if source is not None else None
+        if (
+            self.incremental
+            and cached is not None
+            and source_hash is not None
+            and cached.source_hash == source_hash
+            and time.time() - cached.checked_at < self.revalidate_after
+        ):
+            self.fetch_stats["skipped"] += 1
+            return cached.body
+
+        headers = cached.validators() if cached is not None else {}
         try:
-            response = await self.client.get(endpoint)
+            response = await self.scheduler.run(lambda: self._guarded_get(endpoint, headers))
+            if response.status_code == 304 and cached is not None:
+                self.fetch_stats["not_modified"] += 1
+                cached.source_hash = source_hash
+                cached.checked_at = time.time()
+                await self.cache.put(endpoint, cached)
+                return cached.body
             response.raise_for_status()
-            return response.json()
+
+            body_hash = content_hash(response.content)
+            if cached is not None and cached.body_hash == body_hash:
+                self.fetch_stats["unchanged"] += 1
+                body = cached.body
+            else:
+                self.fetch_stats["changed"] += 1
+                body = response.json()
+            await self.cache.put(
+                endpoint,
+                CachedResponse(
+                    body=body,
+                    body_hash=body_hash,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                    source_hash=source_hash,
+                    checked_at=time.time(),
+                ),
+            )
+            return body
+        except DependencyUnavailable as e:
+            # parliament.bg is down: the last good copy beats dropping the entity
+            if not isinstance(e, CircuitOpenError):
+                logger.error(f"Gave up fetching {endpoint}: {e}")
+            if cached is not None:
+                self.fetch_stats["stale"] += 1
+                return cached.body
+            self.fetch_stats["unavailable"] += 1
         except httpx.HTTPError as e:
             logger.error(f"HTTP error occurred while fetching {endpoint}: {e}")
         except Exception as e:
@@ -81,11 +214,65 @@ class EntityMaintainer:
             logger.warning(f"Failed to transform data to Entity: {e}")
             return None
 
+    async def _iter(
+        self,
+        items: List[Mapping],
+        process: Callable[[Mapping], Awaitable[Optional[Entity]]],
+        ent_type: EntityType,
+    ) -> AsyncIterator[Entity]:
+        """
+        Runs `process` for every list item and yields entities as they complete;
+        pacing is left to the scheduler. At most `SYNC_CHUNK_SIZE` items are in
+        flight, so finished entities can't pile up ahead of a slow consumer.
+        """
+        progress = SyncProgress(total=len(items))
+        self.progress[ent_type.value] = progress
+
+        async def _tracked(item: Mapping) -> Optional[Entity]:
+            try:
+                return await process(item)
+            except Exception as e:
+                logger.warning(f"failed to process {ent_type.value} {item}: {e}")
+                return None
+            finally:
+                progress.processed += 1
+                if progress.processed % 20 == 0:
+                    logger.info(
+                        f"processed {progress.processed}/{progress.total} {ent_type.value} "
+                        f"at {self.scheduler.rate:.1f} req/s"
+                    )
+
+        window = max(1, settings.SYNC_CHUNK_SIZE)
+        remaining = iter(items)
+        pending: Set[asyncio.Future] = set()
+        try:
+            while True:
+                for item in islice(remaining, window - len(pending)):
+                    pending.add(asyncio.ensure_future(_tracked(item)))
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    entity = task.result()
+                    if entity is not None:
+                        yield entity
+        finally:
+            for task in pending:
+                task.cancel()
+
     async def get_mps(self) -> List[Entity]:
+        return [entity async for entity in self.iter_mps()]
+
+    async def get_committees(self) -> List[Entity]:
+        return [entity async for entity in self.iter_committees()]
+
+    async def iter_mps(self) -> AsyncIterator[Entity]:
         async def _process_mp(item) -> Entity | None:
             mp = _p_Mp_Def(**item)
             ent_url = HttpUrl(url=self.base_url + f"/mp-profile/bg/{mp.A_ns_MP_id}")
-            resp = await self._fetch(ent_url.encoded_string())
+            resp = await self._fetch(ent_url.encoded_string(), source=item)
             if not resp:
                 logger.warning(
                     f"could not get detail for {EntityType.MP} {mp.A_ns_MP_id}"
@@ -101,28 +288,18 @@ class EntityMaintainer:
             return entity
 
         """
-        Fetches all MPs from the external API and translates them into Entity objects.
+        Fetches all MPs from the external API and yields them as Entity objects.
         """
         data = await self._fetch("coll-list-ns/bg")
         if not data:
-            return []
+            return
         raw_entities: List[Mapping] = data["colListMP"]
-        entities: List[Entity] = []
-
-        batch_size = 5
-        for i in range(0, len(raw_entities), 5):
-            batch = raw_entities[i : i + batch_size]
-            tasks = [_process_mp(item) for item in batch]
-            results = await asyncio.gather(*tasks)
-            entities.extend([ent for ent in results if ent is not None])
-            if i + batch_size < len(raw_entities):
-                logger.info(f"processed {i}/{len(raw_entities)}")
-                await asyncio.sleep(1.0)
-        return entities
+        async for entity in self._iter(raw_entities, _process_mp, EntityType.MP):
+            yield entity
 
-    async def get_committees(self) -> List[Entity]:
+    async def iter_committees(self) -> AsyncIterator[Entity]:
         """
-        Fetches all committees from the external API and translates them into Entity objects.
+        Fetches all committees from the external API and yields them as Entity objects.
         """
 
         async def _process_committee(item) -> Entity | None:
@@ -130,9 +307,9 @@ class EntityMaintainer:
             ent_url = HttpUrl(
                 url=self.base_url + f"/coll-list-mp/bg/{comm.A_ns_C_id}/3"
             )
-            resp = await self._fetch(ent_url.encoded_string())
+            resp = await self._fetch(ent_url.encoded_string(), source=item)
             if not resp:
-                print(
+                logger.warning(
                     f"could not get detail for {str(EntityType.COMMITTEE)} {comm.A_ns_C_id}"
                 )
                 return
@@ -147,71 +324,228 @@ class EntityMaintainer:
 
         data = await self._fetch("coll-list/bg/3")
         if not data:
-            return []
+            return
         raw_entities: List[Mapping] = data
-        entities: List[Entity] = []
+        async for entity in self._iter(
+            raw_entities, _process_committee, EntityType.COMMITTEE
+        ):
+            yield entity
+
+    async def sync_entities(
+        self,
+        entities: Union[Iterable[Entity], AsyncIterable[Entity]],
+        ent_types: Optional[List[EntityType]] = None,
+    ) -> SyncReport:
+        """
+        Synchronizes the provided entities with the PocketBase database.
 
-        batch_size = 5
-        for i in range(0, len(raw_entities), 5):
-            batch = raw_entities[i : i + batch_size]
-            tasks = [_process_committee(item) for item in batch]
-            results = await asyncio.gather(*tasks)
-            entities.extend([ent for ent in results if ent is not None])
-            if i + batch_size < len(raw_entities):
-                print(f"processed {i}/{len(raw_entities)})")
-                await asyncio.sleep(1.0)
-        return entities
+        Entities are consumed in chunks of `SYNC_CHUNK_SIZE` as they arrive: each chunk
+        is matched by email against only the records it touches, and only the ones
+        whose fields differ are written. Stale records are found at the end from the
+        set of emails seen, and only among `ent_types` (default: the types present in a
+        plain list), so syncing one source never deletes another source's entities.
+        """
+        if not isinstance(entities, AsyncIterable):
+            entities = list(entities)
+            if ent_types is None:
+                ent_types = sorted({e.ent_type for e in entities}, key=lambda t: t.value)
+            entities = _aiter(entities)
+        report = SyncReport(ent_types=ent_types or [])
+        if not ent_types:
+            return report
+
+        started = time.perf_counter()
+        timings = dict.fromkeys(("lookup", "write", "delete"), 0.0)
+        seen_emails: Set[str] = set()
+
+        async for chunk in _chunks(entities, settings.SYNC_CHUNK_SIZE):
+            incoming: Dict[str, Entity] = {}
+            for entity in chunk:
+                if entity.email in seen_emails:
+                    report.duplicates += 1
+                    continue
+                seen_emails.add(entity.email)
+                incoming[entity.email] = entity
+
+            t = time.perf_counter()
+            existing = await repository.get_entities_by_email(list(incoming), ent_types)
+            db_by_email = {e.email: e for e in existing if e.id is not None}
+            timings["lookup"] += time.perf_counter() - t
+
+            creates: List[Entity] = []
+            updates: List[Tuple[str, Entity]] = []
+            for email, entity in incoming.items():
+                current = db_by_email.get(email)
+                if current is None:
+                    creates.append(entity)
+                    continue
+                if entity_key(current) != entity_key(entity):
+                    updates.append((current.id, entity))  # pyright: ignore[reportArgumentType]
+                else:
+                    report.unchanged += 1
+
+            t = time.perf_counter()
+            written = await repository.write_entities(creates, updates)
+            timings["write"] += time.perf_counter() - t
+            report.created += written["created"]
+            report.updated += written["updated"]
+            report.failed += written["failed"]
+
+        t = time.perf_counter()
+        if seen_emails:
+            stored = await repository.get_entity_emails(ent_types)
+            stale = [id for id, email in stored.items() if email not in seen_emails]
+            written = await repository.write_entities(deletes=list(stale))
+            report.deleted = written["deleted"]
+            report.failed += written["failed"]
+        else:
+            # An empty scrape is far more likely an upstream failure than a real result
+            logger.warning(f"no {[t.value for t in ent_types]} entities received, skipping stale cleanup")
+        timings["delete"] = time.perf_counter() - t
+
+        if report.created or report.updated or report.deleted:
+            t = time.perf_counter()
+            try:
+                await entity_index.refresh(ent_types)
+            except Exception as e:
+                logger.error(f"could not refresh the entity index: {e}")
+            timings["index"] = time.perf_counter() - t
+        timings["total"] = time.perf_counter() - started
+        report.timings = timings
 
-    async def sync_entities(self, entities: List[Entity]):
+        logger.info(f"entity sync for {[t.value for t in ent_types]}: {report}")
+        return report
+
+    async def run_full_sync(self, incremental: Optional[bool] = None) -> List[SyncReport]:
         """
-        Synchronizes the provided list of entities with the PocketBase database.
-        Performs an upsert based on the email address.
+        Orchestrates the full fetching and synchronization process.
+        The MP and committee pipelines run concurrently and share the scheduler's budget.
+        `incremental=False` forces every detail page to be requested again.
         """
-        coll_entity = pb.collection("entity")
-        # Prepare the database entities for comparisson
-        db_entities_raw = coll_entity.get_full_list(batch=300)
-        db_entities_models = [Entity.model_validate(e) for e in db_entities_raw]
-        db_entities_map = {
-            e.email: e.id for e in db_entities_models if e.id is not None
-        }
-        db_entities_cmp = set(db_entities_map.keys())
+        logger.info("Starting full entity synchronization...")
+        self.incremental = (
+            settings.SCRAPER_INCREMENTAL if incremental is None else incremental
+        )
+        self.fetch_stats.clear()
+        self.progress.clear()
+        self._fetched.clear()
+        mps: List[Entity] = []
+        committees: List[Entity] = []
+        snapshot = bool(settings.SYNC_SNAPSHOT_PATH)
+        # The entities are only kept in memory when they go into a snapshot
+        mp_items = _collect(self.iter_mps(), mps) if snapshot else self.iter_mps()
+        committee_items = (
+            _collect(self.iter_committees(), committees)
+            if snapshot
+            else self.iter_committees()
+        )
 
-        incoming_entities_cmp = {e.email for e in entities}
+        # If one pipeline fails the other is cancelled and awaited, so a failed sync
+        # leaves nothing writing to PocketBase behind it
+        try:
+            async with asyncio.TaskGroup() as group:
+                tasks = (
+                    group.create_task(self.sync_entities(mp_items, [EntityType.MP])),
+                    group.create_task(
+                        self.sync_entities(committee_items, [EntityType.COMMITTEE])
+                    ),
+                )
+        except ExceptionGroup as e:
+            raise e.exceptions[0]
+        reports = [task.result() for task in tasks]
 
-        stale_mails = db_entities_cmp - incoming_entities_cmp
+        template_manager.invalidate()
 
-        for mail in stale_mails:
-            coll_entity.delete(db_entities_map[mail])
+        logger.info(
+            f"Full entity synchronization complete. Fetches: {dict(self.fetch_stats)}"
+        )
+        if snapshot:
+            if mps and committees:
+                await self.write_snapshot(settings.SYNC_SNAPSHOT_PATH, mps + committees)
+            else:
+                # Replaying an empty source would delete its entities, keep the old file
+                logger.warning("not writing an entity snapshot for an incomplete scrape")
+        return reports
+
+    async def write_snapshot(self, path: str, entities: List[Entity]) -> None:
+        """Snapshots the payloads fetched by the last sync together with `entities`."""
+        responses = []
+        for endpoint in self._fetched:
+            cached = await self.cache.get(endpoint)
+            if cached is not None:
+                responses.append((endpoint, cached))
+        ent_types = sorted({e.ent_type for e in entities}, key=lambda t: t.value)
+        try:
+            counts = await asyncio.to_thread(
+                write_snapshot, path, self.base_url, ent_types, responses, entities
+            )
+        except OSError as e:
+            logger.error(f"could not write entity snapshot {path}: {e}")
+            return
+        logger.info(f"wrote entity snapshot {path}: {counts[0]} payloads, {counts[1]} entities")
 
-        for entity in entities:
-            try:
-                if entity.email in db_entities_cmp:
-                    coll_entity.update(
-                        id=db_entities_map[entity.email],
-                        body_params=entity.model_dump(
-                            exclude={"id", "created", "updated"}
-                        ),
-                    )
-                else:
-                    # Create new record
-                    coll_entity.create(
-                        entity.model_dump(exclude={"id", "created", "updated"})
-                    )
-            except Exception as e:
-                logger.error(f"Failed to sync entity {entity.email}: {e}")
+    async def replay_snapshot(self, path: str, seed_cache: bool = True) -> List[SyncReport]:
+        """
+        Runs `sync_entities` on the entities of a snapshot instead of scraping, one
+        report per entity type it holds. With `seed_cache`, its payloads also fill the
+        scraper cache, so the next incremental sync only asks parliament.bg for what
+        changed since. Raises `SnapshotError` for an unreadable file.
+        """
+        logger.info(f"Replaying entity snapshot {path}...")
+        self.progress.clear()
+        snapshot = await asyncio.to_thread(read_snapshot, path)
+        if seed_cache:
+            for endpoint, cached in snapshot.responses.items():
+                if await self.cache.get(endpoint) is None:
+                    await self.cache.put(endpoint, cached)
+
+        reports = []
+        for ent_type, entities in snapshot.entities_by_type().items():
+            self.progress[ent_type.value] = SyncProgress(total=len(entities))
+            reports.append(await self.sync_entities(entities, [ent_type]))
+            self.progress[ent_type.value].processed = len(entities)
+
+        template_manager.invalidate()
+        logger.info(
+            f"Replayed snapshot from {snapshot.created.isoformat()}: "
+            f"{len(snapshot.entities)} entities, {len(snapshot.responses)} payloads"
+        )
+        return reports
+
+    async def aclose(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+async def _collect(items: AsyncIterable[Entity], into: List[Entity]) -> AsyncIterator[Entity]:
+    async for item in items:
+        into.append(item)
+        yield item
+
+
+async def _aiter(items: Iterable[Entity]) -> AsyncIterator[Entity]:
+    for item in items:
+        yield item
 
-    async def run_full_sync(self):
-        """Orchestrates the full fetching and synchronization process."""
-        logger.info("Starting full entity synchronization...")
 
-        mps = await self.get_mps()
-        await self.sync_entities(mps)
+async def _chunks(
+    items: AsyncIterable[Entity], size: int
+) -> AsyncIterator[List[Entity]]:
+    chunk: List[Entity] = []
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
-        committees = await self.get_committees()
-        await self.sync_entities(committees)
 
-        logger.info("Full entity synchronization complete.")
-        await self.client.aclose()
+def _endpoint_label(endpoint: str) -> str:
+    """Metric label for a parliament.bg endpoint, with record ids collapsed."""
+    path = httpx.URL(endpoint).path.split("/api/v1/", 1)[-1].strip("/")
+    return re.sub(r"(?<=/)\d+(?=/|$)", "{id}", path)
 
 
 entity_maintainer = EntityMaintainer()
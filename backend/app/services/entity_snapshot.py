@@ -0,0 +1,158 @@
+"""
+Entity snapshots: what one sync scraped, in a file that can be replayed without
+parliament.bg.
+
+A snapshot is gzip-compressed JSON lines, one record per line, written and read as
+a stream:
+
+    {"kind": "header", "format": "glas-entity-snapshot", "version": 1, ...}
+    {"kind": "response", "endpoint": ..., "body": ..., "etag": ..., ...}   raw payloads
+    {"kind": "entity", "name": ..., "email": ..., "ent_type": ..., ...}    the result
+    {"kind": "end", "responses": 290, "entities": 265}
+
+The trailer makes a truncated file detectable. Readers reject other formats and
+newer versions.
+"""
+
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.api.models import Entity, EntityType
+from app.services.response_cache import CachedResponse
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "glas-entity-snapshot"
+SNAPSHOT_VERSION = 1
+
+_ENTITY_FIELDS = {"name", "email", "ent_type", "ent_source"}
+
+
+class SnapshotError(Exception):
+    """The file is not a complete snapshot this version can read."""
+
+
+class Snapshot:
+    __slots__ = ("created", "source", "ent_types", "responses", "entities")
+
+    def __init__(
+        self,
+        created: datetime,
+        source: str,
+        ent_types: List[EntityType],
+        responses: Dict[str, CachedResponse],
+        entities: List[Entity],
+    ) -> None:
+        self.created = created
+        self.source = source
+        self.ent_types = ent_types
+        self.responses = responses
+        self.entities = entities
+
+    def entities_by_type(self) -> Dict[EntityType, List[Entity]]:
+        grouped: Dict[EntityType, List[Entity]] = {t: [] for t in self.ent_types}
+        for entity in self.entities:
+            grouped.setdefault(entity.ent_type, []).append(entity)
+        return grouped
+
+
+def write_snapshot(
+    path: str,
+    source: str,
+    ent_types: Sequence[EntityType],
+    responses: Iterable[Tuple[str, CachedResponse]],
+    entities: Iterable[Entity],
+) -> Tuple[int, int]:
+    """
+    Streams a snapshot to `path`, replacing it only once complete.
+    Returns the number of (responses, entities) written.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = path + ".tmp"
+    counts = [0, 0]
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+
+        def line(record: Dict[str, Any]) -> None:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+            f.write("\n")
+
+        line(
+            {
+                "kind": "header",
+                "format": SNAPSHOT_FORMAT,
+                "version": SNAPSHOT_VERSION,
+                "created": datetime.now(timezone.utc).isoformat(),
+                "source": source,
+                "ent_types": [t.value for t in ent_types],
+            }
+        )
+        for endpoint, cached in responses:
+            line(
+                {
+                    "kind": "response",
+                    "endpoint": endpoint,
+                    "etag": cached.etag,
+                    "last_modified": cached.last_modified,
+                    "body_hash": cached.body_hash,
+                    "source_hash": cached.source_hash,
+                    "body": cached.body,
+                }
+            )
+            counts[0] += 1
+        for entity in entities:
+            line({"kind": "entity", **entity.model_dump(mode="json", include=_ENTITY_FIELDS)})
+            counts[1] += 1
+        line({"kind": "end", "responses": counts[0], "entities": counts[1]})
+    os.replace(tmp, path)
+    return counts[0], counts[1]
+
+
+def read_snapshot(path: str) -> Snapshot:
+    """Reads a snapshot line by line. Entities are validated like any outside input."""
+    header: Optional[Dict[str, Any]] = None
+    trailer: Optional[Dict[str, Any]] = None
+    responses: Dict[str, CachedResponse] = {}
+    entities: List[Entity] = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for number, raw in enumerate(f, 1):
+                record = json.loads(raw)
+                kind = record.pop("kind", None)
+                if header is None:
+                    if kind != "header" or record.get("format") != SNAPSHOT_FORMAT:
+                        raise SnapshotError(f"{path} is not an entity snapshot")
+                    if record.get("version", 0) > SNAPSHOT_VERSION:
+                        raise SnapshotError(
+                            f"{path} has version {record['version']}, "
+                            f"this build reads up to {SNAPSHOT_VERSION}"
+                        )
+                    header = record
+                elif kind == "response":
+                    endpoint = record.pop("endpoint")
+                    responses[endpoint] = CachedResponse(**record)
+                elif kind == "entity":
+                    entities.append(Entity.model_validate(record))
+                elif kind == "end":
+                    trailer = record
+                else:
+                    logger.warning(f"{path}:{number}: skipping unknown record {kind!r}")
+    except (OSError, EOFError, ValueError, TypeError, KeyError) as e:
+        raise SnapshotError(f"could not read snapshot {path}: {e}") from e
+
+    if header is None or trailer is None:
+        raise SnapshotError(f"{path} is truncated")
+    if (trailer.get("responses"), trailer.get("entities")) != (len(responses), len(entities)):
+        raise SnapshotError(f"{path} does not match its trailer")
+    return Snapshot(
+        created=datetime.fromisoformat(header["created"]),
+        source=header.get("source", ""),
+        ent_types=[EntityType(t) for t in header.get("ent_types", [])],
+        responses=responses,
+        entities=entities,
+    )
@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import json
+import logging
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.services.shared_state import shared_state
+
+logger = logging.getLogger(__name__)
+
+# Shared-state value of a key whose request is still running
+_IN_FLIGHT = "in-flight"
+
+
+class RequestInProgress(Exception):
+    """The same request is being handled by another worker."""
+
+
+class IdempotencyGuard:
+    """
+    Runs each distinct request once. Identical requests that arrive while the first
+    one is running in this process wait on its future, and repeats within `window`
+    seconds get its stored result back, from any worker when the state is shared.
+    Only results are stored; a failed request can be retried straight away.
+    """
+
+    def __init__(self, state: Any, window: float, in_flight_ttl: float) -> None:
+        self.state = state
+        self.window = window
+        self.in_flight_ttl = in_flight_ttl
+        self._running: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def key(
+        scope: str,
+        mail_hash: str,
+        template_id: str,
+        client_key: Optional[str] = None,
+        *extra: object,
+    ) -> str:
+        parts = (scope, mail_hash, template_id, client_key or "", *map(str, extra))
+        return "idem:" + hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """`call` must return a JSON-serializable result."""
+        pending = self._running.get(key)
+        if pending is not None:
+            logger.debug(f"Coalesced duplicate request {key}")
+            return await asyncio.shield(pending)
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._running[key] = future
+        try:
+            result = await self._run_once(key, call)
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody may be awaiting the future; mark the exception as retrieved.
+            future.exception()
+            raise
+        finally:
+            self._running.pop(key, None)
+        future.set_result(result)
+        return result
+
+    async def _run_once(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        # The marker expires on its own if the worker dies mid-request
+        if not await self.state.set(key, _IN_FLIGHT, ttl=self.in_flight_ttl, only_new=True):
+            stored = await self.state.get(key)
+            if stored is None or stored == _IN_FLIGHT:
+                raise RequestInProgress(key)
+            logger.debug(f"Replayed stored result for {key}")
+            return json.loads(stored)
+
+        # A slow request keeps its marker alive; the TTL only has to cover a dead worker
+        refresher = asyncio.create_task(self._keep_in_flight(key))
+        try:
+            result = await call()
+        except BaseException:
+            await self._stop(refresher)
+            await self.state.delete(key)
+            raise
+        await self._stop(refresher)
+        await self.state.set(key, json.dumps(result), ttl=self.window)
+        return result
+
+    async def _keep_in_flight(self, key: str) -> None:
+        while True:
+            await asyncio.sleep(self.in_flight_ttl / 3)
+            try:
+                await self.state.set(key, _IN_FLIGHT, ttl=self.in_flight_ttl)
+            except Exception as e:
+                logger.warning(f"Failed to refresh in-flight marker {key}: {e}")
+
+    @staticmethod
+    async def _stop(refresher: asyncio.Task) -> None:
+        # Wait for the task so a refresh in progress can't land after the result
+        refresher.cancel()
+        with suppress(asyncio.CancelledError):
+            await refresher
+
+
+idempotency = IdempotencyGuard(
+    shared_state,
+    window=settings.IDEMPOTENCY_WINDOW_SECONDS,
+    in_flight_ttl=settings.IDEMPOTENCY_IN_FLIGHT_SECONDS,
+)
@@ -1,25 +1,60 @@
-from typing import Optional
-import aiosmtplib
+import asyncio
+import logging
+from typing import List, Optional
 from email.message import EmailMessage
-from mailtrap import (
-    Address,
+from app.api.models import OutgoingMail
+from app.core.config import settings
+from app.services.mailtrap_transport import (
     ClientConfigurationError,
-    MailtrapClient,
-    Mail,
-    MailtrapError,
+    MailtrapTransport,
 )
-from app.core.config import settings
+from app.services.smtp_pool import SMTPPool
+
+logger = logging.getLogger(__name__)
 
-# Initialize Mailtrap client only if needed
-client = None
-if not settings.USE_LOCAL_MAIL:
-    token = settings.MAILTRAP_API_TOKEN
-    if not token:
-        raise ClientConfigurationError("no mailtrap token provided")
-    client = MailtrapClient(token=token)
+# The Mailtrap transport is created on first use (or by `MailSender.open` at startup)
+client: Optional[MailtrapTransport] = None
+
+smtp_pool = SMTPPool(
+    hostname=settings.LOCAL_SMTP_HOST,
+    port=settings.LOCAL_SMTP_PORT,
+    size=settings.SMTP_POOL_SIZE,
+    max_messages=settings.SMTP_MAX_MESSAGES_PER_CONNECTION,
+    idle_check_seconds=settings.SMTP_IDLE_CHECK_SECONDS,
+    timeout=settings.SMTP_TIMEOUT,
+    call_timeout=settings.SMTP_CALL_TIMEOUT,
+)
+
+
+def _mailtrap() -> MailtrapTransport:
+    global client
+    if client is None:
+        if not settings.MAILTRAP_API_TOKEN:
+            raise ClientConfigurationError("MAILTRAP_API_TOKEN is not set")
+        client = MailtrapTransport(
+            token=settings.MAILTRAP_API_TOKEN,
+            base_url=settings.MAILTRAP_API_URL,
+            timeout=settings.MAILTRAP_TIMEOUT,
+            call_timeout=settings.MAILTRAP_CALL_TIMEOUT,
+        )
+    return client
 
 
 class MailSender:
+    @staticmethod
+    def open() -> None:
+        """Prepares the configured transport. Connections are still opened lazily."""
+        if not settings.USE_LOCAL_MAIL:
+            try:
+                _mailtrap()
+            except ClientConfigurationError as e:
+                # Don't keep the API from starting; sends will fail until it's fixed
+                logger.error(f"mail transport is not usable: {e}")
+
+    @staticmethod
+    def configured() -> bool:
+        return settings.USE_LOCAL_MAIL or client is not None
+
     @staticmethod
     async def send_mail(
         to_email: list[str],
@@ -28,55 +63,55 @@ class MailSender:
         content: str,
         reply_to: Optional[str] = None,
     ):
+        mail = OutgoingMail(
+            to_email=to_email,
+            sender=sender,
+            subject=subject,
+            content=content,
+            reply_to=reply_to,
+        )
         if settings.USE_LOCAL_MAIL:
-            await MailSender._send_local(to_email, sender, subject, content, reply_to)
+            await MailSender._send_local(mail)
         else:
-            await MailSender._send_mailtrap(to_email, sender, subject, content, reply_to)
+            await MailSender._send_mailtrap(mail)
 
     @staticmethod
-    async def _send_local(
-        to_email: list[str],
-        sender: str,
-        subject: str,
-        content: str,
-        reply_to: Optional[str] = None,
-    ):
-        message = EmailMessage()
-        message["From"] = sender
-        message["To"] = ", ".join(to_email)
-        message["Subject"] = subject
-        if reply_to:
-            message["Reply-To"] = reply_to
-        message.set_content(content, subtype="html")
-
-        await aiosmtplib.send(
-            message,
-            hostname=settings.LOCAL_SMTP_HOST,
-            port=settings.LOCAL_SMTP_PORT,
+    async def send_batch(mails: List[OutgoingMail]) -> List[Optional[Exception]]:
+        """
+        Sends several mails at once. Returns one entry per mail,
+        `None` on success or the exception that made it fail.
+        """
+        if not settings.USE_LOCAL_MAIL:
+            return await _mailtrap().send_batch(mails)
+
+        results = await asyncio.gather(
+            *(MailSender._send_local(m) for m in mails), return_exceptions=True
         )
+        return [r if isinstance(r, Exception) else None for r in results]
 
     @staticmethod
-    async def _send_mailtrap(
-        to_email: list[str],
-        sender: str,
-        subject: str,
-        content: str,
-        reply_to: Optional[str] = None,
-    ):
-        if client is None:
-            raise ClientConfigurationError("Mailtrap client not initialized")
-            
-        receivers = [Address(email=receiver) for receiver in to_email]
-        message = Mail(
-            to=receivers,
-            sender=Address(email=sender),
-            reply_to=Address(email=reply_to) if reply_to is not None else None,
-            subject=subject,
-            html=content,
-        )
-        result = client.send(message)
-        if not result["success"]:
-            raise MailtrapError(result)
+    async def _send_local(mail: OutgoingMail):
+        message = EmailMessage()
+        message["From"] = mail.sender
+        message["To"] = ", ".join(mail.to_email)
+        message["Subject"] = mail.subject
+        if mail.reply_to:
+            message["Reply-To"] = mail.reply_to
+        message.set_content(mail.content, subtype="html")
+
+        await smtp_pool.send(message)
+
+    @staticmethod
+    async def _send_mailtrap(mail: OutgoingMail):
+        await _mailtrap().send(mail)
+
+    @staticmethod
+    async def aclose():
+        global client
+        await smtp_pool.close()
+        if client is not None:
+            await client.aclose()
+            client = None
 
 
 mail_sender = MailSender()
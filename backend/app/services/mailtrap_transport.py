@@ -0,0 +1,117 @@
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.api.models import OutgoingMail
+from app.core.metrics import metrics
+from app.services.circuit_breaker import circuit_breaker
+
+# Mailtrap accepts at most this many messages per batch call
+MAX_BATCH_SIZE = 500
+
+
+class ClientConfigurationError(Exception):
+    pass
+
+
+class MailtrapError(Exception):
+    def __init__(self, errors: Any) -> None:
+        super().__init__(f"Mailtrap rejected the message: {errors}")
+        self.errors = errors
+
+
+class MailtrapTransport:
+    """
+    Async client for the Mailtrap sending API. One pooled `httpx.AsyncClient` is
+    reused for every call; `base_url` can point to a local stub. Calls go through
+    the `mailtrap` circuit breaker, bounded by `call_timeout`.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        base_url: str,
+        timeout: float = 30.0,
+        call_timeout: Optional[float] = None,
+    ) -> None:
+        if not token:
+            raise ClientConfigurationError("no mailtrap token provided")
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        self.breaker = circuit_breaker(
+            "mailtrap",
+            timeout=call_timeout,
+            is_failure=lambda e: isinstance(e, httpx.TransportError),
+        )
+
+    async def _post(self, path: str, payload: Dict[str, Any]) -> httpx.Response:
+        async with self.breaker.guard() as attempt:
+            response = await self.client.post(path, json=payload)
+            # A rejected message is the sender's problem, not an outage
+            attempt.failed = response.is_server_error or response.status_code == 429
+        return response
+
+    async def send(self, mail: OutgoingMail) -> None:
+        with metrics.span("mailtrap", "send") as span:
+            response = await self._post("/api/send", _to_payload(mail))
+            span.error = response.is_error
+        data = _json(response)
+        if response.is_error or not data.get("success", False):
+            raise MailtrapError(data.get("errors", data))
+
+    async def send_batch(
+        self, mails: List[OutgoingMail]
+    ) -> List[Optional[Exception]]:
+        """
+        Sends the mails through the batch endpoint.
+        Returns one entry per mail, `None` on success or the error that rejected it.
+        """
+        results: List[Optional[Exception]] = []
+        for i in range(0, len(mails), MAX_BATCH_SIZE):
+            chunk = mails[i : i + MAX_BATCH_SIZE]
+            with metrics.span("mailtrap", "batch") as span:
+                response = await self._post(
+                    "/api/batch", {"requests": [_to_payload(m) for m in chunk]}
+                )
+                span.error = response.is_error
+            data = _json(response)
+            if response.is_error or not data.get("success", False):
+                error = MailtrapError(data.get("errors", data))
+                results.extend(error for _ in chunk)
+                continue
+            responses = data.get("responses", [])[: len(chunk)]
+            for item in responses:
+                if item.get("success", False):
+                    results.append(None)
+                else:
+                    results.append(MailtrapError(item.get("errors", item)))
+            # Unanswered messages count as failed, so their jobs are retried
+            missing = MailtrapError("no response for this message")
+            results.extend(missing for _ in range(len(chunk) - len(responses)))
+        return results
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+def _to_payload(mail: OutgoingMail) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {
+        "from": {"email": mail.sender},
+        "to": [{"email": receiver} for receiver in mail.to_email],
+        "subject": mail.subject,
+        "html": mail.content,
+    }
+    if mail.reply_to is not None:
+        payload["reply_to"] = {"email": mail.reply_to}
+    return payload
+
+
+def _json(response: httpx.Response) -> Dict[str, Any]:
+    try:
+        data = response.json()
+    except ValueError:
+        return {"success": False, "errors": [response.text]}
+    return data if isinstance(data, dict) else {"success": False, "errors": data}
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import secrets
+import string
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.api.models import AuthState
+from app.core.config import settings
+from app.services.pb_repository import repository
+from app.services.shared_state import get_redis
+
+logger = logging.getLogger(__name__)
+
+_ID_ALPHABET = string.ascii_lowercase + string.digits
+
+
+def new_record_id() -> str:
+    """Generates a PocketBase-compatible record id, so audit rows can be written later."""
+    return "".join(secrets.choice(_ID_ALPHABET) for _ in range(15))
+
+
+class OTPEntry:
+    __slots__ = ("attempt_id", "code", "expires", "attempts")
+
+    def __init__(self, attempt_id: str, code: int, expires: float, attempts: int = 0):
+        self.attempt_id = attempt_id
+        self.code = code
+        self.expires = expires
+        self.attempts = attempts
+
+
+class MemoryOTPStore:
+    """Single-process store: mail_hash -> the one live OTP for it."""
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, OTPEntry] = {}
+
+    async def put(self, mail_hash: str, entry: OTPEntry) -> Optional[OTPEntry]:
+        previous = self._entries.get(mail_hash)
+        self._entries[mail_hash] = entry
+        return previous
+
+    async def get(self, mail_hash: str) -> Optional[OTPEntry]:
+        return self._entries.get(mail_hash)
+
+    async def incr_attempts(self, mail_hash: str) -> int:
+        entry = self._entries.get(mail_hash)
+        if entry is None:
+            return 0
+        entry.attempts += 1
+        return entry.attempts
+
+    async def consume(self, mail_hash: str, attempt_id: str) -> bool:
+        entry = self._entries.get(mail_hash)
+        if entry is None or entry.attempt_id != attempt_id:
+            return False
+        del self._entries[mail_hash]
+        return True
+
+    async def delete(self, mail_hash: str) -> None:
+        self._entries.pop(mail_hash, None)
+
+    async def sweep(self, now: float) -> List[OTPEntry]:
+        expired = [h for h, e in self._entries.items() if e.expires <= now]
+        return [self._entries.pop(h) for h in expired]
+
+
+class RedisOTPStore:
+    """
+    Store shared between workers. Each OTP lives in a Redis hash with a TTL, so
+    Redis itself drops expired codes; `sweep` has nothing to collect.
+    """
+
+    def __init__(self, client: Any, prefix: str = "otp:") -> None:
+        self.client = client
+        self.prefix = prefix
+
+    async def put(self, mail_hash: str, entry: OTPEntry) -> Optional[OTPEntry]:
+        key = self.prefix + mail_hash
+        previous = await self.get(mail_hash)
+        ttl = max(1, int(entry.expires - time.time()))
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(
+                key,
+                mapping={
+                    "attempt_id": entry.attempt_id,
+                    "code": entry.code,
+                    "expires": entry.expires,
+                    "attempts": entry.attempts,
+                },
+            )
+            pipe.expire(key, ttl)
+            await pipe.execute()
+        return previous
+
+    async def get(self, mail_hash: str) -> Optional[OTPEntry]:
+        fields = await self.client.hgetall(self.prefix + mail_hash)
+        if not fields:
+            return None
+        fields = {_decode(k): _decode(v) for k, v in fields.items()}
+        if "attempt_id" not in fields:
+            return None  # Left behind by an increment racing a delete
+        return OTPEntry(
+            attempt_id=fields["attempt_id"],
+            code=int(fields["code"]),
+            expires=float(fields["expires"]),
+            attempts=int(fields.get("attempts", 0)),
+        )
+
+    async def incr_attempts(self, mail_hash: str) -> int:
+        key = self.prefix + mail_hash
+
+        # HINCRBY alone would recreate a deleted or expired code as a bare hash
+        # without a TTL, so it only runs while the key still exists (WATCH/MULTI)
+        async def increment(pipe: Any) -> None:
+            if await pipe.exists(key):
+                pipe.multi()
+                pipe.hincrby(key, "attempts", 1)
+
+        results = await self.client.transaction(increment, key)
+        return int(results[-1]) if results else 0
+
+    async def consume(self, mail_hash: str, attempt_id: str) -> bool:
+        """
+        Deletes the code if it is still `attempt_id`. Of concurrent callers, on any
+        worker, only the one whose delete went through gets True.
+        """
+        key = self.prefix + mail_hash
+
+        async def delete_if_current(pipe: Any) -> None:
+            current = await pipe.hget(key, "attempt_id")
+            if current is not None and _decode(current) == attempt_id:
+                pipe.multi()
+                pipe.delete(key)
+
+        results = await self.client.transaction(delete_if_current, key)
+        return bool(results and results[-1])
+
+    async def delete(self, mail_hash: str) -> None:
+        await self.client.delete(self.prefix + mail_hash)
+
+    async def sweep(self, now: float) -> List[OTPEntry]:
+        return []
+
+
+def _decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class AuthAuditWriter:
+    """
+    Write-behind of `auth_attempt` records. The OTP path only enqueues; a single
+    background task writes creations and state changes to PocketBase in order.
+    """
+
+    def __init__(self) -> None:
+        self._queue: asyncio.Queue[Tuple[str, str, Dict[str, Any]]] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def created(self, attempt_id: str, mail_hash: str, code: int, expires: float) -> None:
+        self._queue.put_nowait(
+            (
+                "create",
+                attempt_id,
+                {
+                    "mail_hash": mail_hash,
+                    "code": code,
+                    "expires": datetime.fromtimestamp(expires, timezone.utc),
+                },
+            )
+        )
+
+    def state_changed(self, attempt_id: str, state: AuthState) -> None:
+        self._queue.put_nowait(("state", attempt_id, {"state": state}))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"dropping {self._queue.qsize()} unwritten auth audit records")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            kind, attempt_id, data = await self._queue.get()
+            try:
+                if kind == "create":
+                    await repository.create_auth_attempt(
+                        data["mail_hash"], data["code"], data["expires"], attempt_id
+                    )
+                else:
+                    await repository.set_auth_attempt_state(attempt_id, data["state"])
+            except Exception as e:
+                logger.error(f"failed to write auth audit {kind} for {attempt_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+
+class OTPSweeper:
+    """Periodically drops expired OTPs and records them as expired."""
+
+    def __init__(self, store: Any, audit: AuthAuditWriter) -> None:
+        self.store = store
+        self.audit = audit
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, interval: float) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            for entry in await self.store.sweep(time.time()):
+                self.audit.state_changed(entry.attempt_id, AuthState.EXPIRED)
+
+
+def get_otp_store() -> Any:
+    if not settings.REDIS_URL:
+        return MemoryOTPStore()
+    return RedisOTPStore(get_redis())
+
+
+otp_store = get_otp_store()
+auth_audit = AuthAuditWriter()
+otp_sweeper = OTPSweeper(otp_store, auth_audit)
@@ -0,0 +1,430 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, List, Optional, Sequence
+
+from app.api.models import OutboxJob, OutboxState, OutboxStats, OutgoingMail
+from app.core.config import settings
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.eligibility import eligibility
+from app.services.mail_service import mail_sender
+from app.services.pb_repository import repository
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    mail_hash TEXT NOT NULL,
+    template_id TEXT NOT NULL,
+    to_email TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    content TEXT NOT NULL,
+    reply_to TEXT,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created REAL NOT NULL
+);
+"""
+
+# Columns added after the first release, applied to existing databases on open
+_MIGRATIONS = {
+    "entity_id": "ALTER TABLE outbox ADD COLUMN entity_id TEXT",
+    "delivery_id": "ALTER TABLE outbox ADD COLUMN delivery_id TEXT",
+    "batch_key": "ALTER TABLE outbox ADD COLUMN batch_key TEXT",
+}
+
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS outbox_state_idx ON outbox (state, next_attempt_at);
+CREATE INDEX IF NOT EXISTS outbox_mail_hash_idx ON outbox (mail_hash, state);
+CREATE INDEX IF NOT EXISTS outbox_delivery_idx ON outbox (delivery_id);
+CREATE INDEX IF NOT EXISTS outbox_batch_idx ON outbox (batch_key, state);
+"""
+
+_COLUMNS = (
+    "id, mail_hash, template_id, to_email, sender, subject, content, reply_to, "
+    "state, attempts, last_error, entity_id, delivery_id"
+)
+
+# The mail has left the outbox in these states
+DELIVERED_STATES = (OutboxState.SENT, OutboxState.LOGGED)
+
+# Jobs in these states still hold a slot against the mail_hash rate limit
+_OPEN_STATES = (OutboxState.PENDING.value, OutboxState.SENDING.value, OutboxState.SENT.value)
+
+# How long a worker owns a `sent` job before another worker may retry its log write
+_LOG_LEASE_SECONDS = 60.0
+
+# Window over which the drain rate is reported
+_RATE_WINDOW_SECONDS = 60.0
+
+
+class Outbox:
+    """
+    Durable queue of outgoing letters, persisted in a local SQLite file.
+
+    A job moves pending -> sending -> sent -> logged. The `sent` state is written
+    right after the provider accepts the message, so a crash before the
+    `sent_mail_logs` write is recovered by logging the job again, never by resending it.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self._delivered: Deque[float] = deque()
+        self._delivered_total = 0
+
+    def open(self) -> None:
+        if self._conn is not None:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+        for column, ddl in _MIGRATIONS.items():
+            if column not in existing:
+                self._conn.execute(ddl)
+        # Rows queued before batch keys existed were batched by recipient list
+        self._conn.execute("UPDATE outbox SET batch_key = to_email WHERE batch_key IS NULL")
+        self._conn.executescript(_INDEXES)
+        # Jobs that were mid-send when the process died go back to the queue
+        self._conn.execute(
+            "UPDATE outbox SET state = ? WHERE state = ?",
+            (OutboxState.PENDING.value, OutboxState.SENDING.value),
+        )
+
+    @property
+    def is_open(self) -> bool:
+        return self._conn is not None
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        if self._conn is None:
+            raise RuntimeError("outbox is not open")
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def _run(self, sql: str, params: tuple = ()) -> List[tuple]:
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    # --- producer side ---
+
+    def _insert(self, rows: List[tuple]) -> List[int]:
+        if self._conn is None:
+            raise RuntimeError("outbox is not open")
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                ids = [
+                    self._conn.execute(
+                        "INSERT INTO outbox (mail_hash, template_id, to_email, sender, "
+                        "subject, content, reply_to, state, next_attempt_at, created, "
+                        "entity_id, delivery_id, batch_key) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        row,
+                    ).lastrowid
+                    for row in rows
+                ]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return ids  # pyright: ignore[reportReturnType]
+
+    async def enqueue(
+        self,
+        mail_hash: str,
+        template_id: str,
+        mails: Sequence[OutgoingMail],
+        entity_ids: Optional[Sequence[Optional[str]]] = None,
+        delivery_id: Optional[str] = None,
+    ) -> List[int]:
+        """
+        Queues the mails in one transaction. Mails of a multi-recipient delivery share
+        `delivery_id` and are claimed together, so they go out as one batch.
+        """
+        now = time.time()
+        if entity_ids is None:
+            entity_ids = [None] * len(mails)
+        rows = []
+        for mail, entity_id in zip(mails, entity_ids):
+            to_email = json.dumps(mail.to_email)
+            rows.append(
+                (
+                    mail_hash,
+                    template_id,
+                    to_email,
+                    mail.sender,
+                    mail.subject,
+                    mail.content,
+                    mail.reply_to,
+                    OutboxState.PENDING.value,
+                    now,
+                    now,
+                    entity_id,
+                    delivery_id,
+                    delivery_id if len(mails) > 1 and delivery_id else to_email,
+                )
+            )
+        ids = await asyncio.to_thread(self._insert, rows)
+        self._wakeup.set()
+        return ids
+
+    async def get_delivery(self, delivery_id: str) -> List[OutboxJob]:
+        rows = await self._run(
+            f"SELECT {_COLUMNS} FROM outbox WHERE delivery_id = ? ORDER BY id",
+            (delivery_id,),
+        )
+        return [_to_job(row) for row in rows]
+
+    async def has_open_job(self, mail_hash: str) -> bool:
+        rows = await self._run(
+            "SELECT 1 FROM outbox WHERE mail_hash = ? AND state IN (?, ?, ?) LIMIT 1",
+            (mail_hash, *_OPEN_STATES),
+        )
+        return bool(rows)
+
+    # --- consumer side ---
+
+    def _claim(self, batch_size: int) -> List[OutboxJob]:
+        """
+        Claims either one unlogged send, or up to `batch_size` pending jobs sharing a
+        batch key (same delivery, or same recipient list) so they can be flushed together.
+        """
+        if self._conn is None:
+            raise RuntimeError("outbox is not open")
+        now = time.time()
+        with self._lock:
+            # Unlogged sends are finished first, they only need the PB write
+            row = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM outbox WHERE state = ? AND next_attempt_at <= ? "
+                "ORDER BY id LIMIT 1",
+                (OutboxState.SENT.value, now),
+            ).fetchone()
+            if row is not None:
+                # Push it out so other workers don't pick it up concurrently
+                self._conn.execute(
+                    "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                    (now + _LOG_LEASE_SECONDS, row[0]),
+                )
+                return [_to_job(row)]
+
+            first = self._conn.execute(
+                "SELECT batch_key FROM outbox WHERE state = ? AND next_attempt_at <= ? "
+                "ORDER BY id LIMIT 1",
+                (OutboxState.PENDING.value, now),
+            ).fetchone()
+            if first is None:
+                return []
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM outbox WHERE state = ? AND next_attempt_at <= ? "
+                "AND batch_key = ? ORDER BY id LIMIT ?",
+                (OutboxState.PENDING.value, now, first[0], batch_size),
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE outbox SET state = ? WHERE id = ?",
+                [(OutboxState.SENDING.value, r[0]) for r in rows],
+            )
+        return [_to_job((*r[:8], OutboxState.SENDING.value, *r[9:])) for r in rows]
+
+    async def claim(self, batch_size: int = 1) -> List[OutboxJob]:
+        return await asyncio.to_thread(self._claim, batch_size)
+
+    async def mark(self, job_id: int, state: OutboxState) -> None:
+        next_attempt_at = time.time()
+        if state == OutboxState.SENT:
+            # The current worker writes the log itself; others only pick it up later
+            next_attempt_at += _LOG_LEASE_SECONDS
+        await self._run(
+            "UPDATE outbox SET state = ?, next_attempt_at = ? WHERE id = ?",
+            (state.value, next_attempt_at, job_id),
+        )
+        if state == OutboxState.LOGGED:
+            now = time.monotonic()
+            self._delivered.append(now)
+            self._delivered_total += 1
+
+    async def retry(self, job: OutboxJob, error: str) -> None:
+        """
+        Schedules another attempt with exponential backoff. Unsent jobs fail after
+        `OUTBOX_MAX_ATTEMPTS`; a `sent` job was delivered, and dropping it would lose
+        its dedupe and rate-limit record, so its log write is retried at the longest
+        backoff until it succeeds.
+        """
+        attempts = job.attempts + 1
+        state = job.state
+        if state == OutboxState.SENDING:
+            state = OutboxState.PENDING
+        if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            if state == OutboxState.SENT:
+                logger.error(f"outbox job {job.id} was delivered but is still not logged: {error}")
+            else:
+                state = OutboxState.FAILED
+        backoff = min(attempts, settings.OUTBOX_MAX_ATTEMPTS) - 1
+        delay = settings.OUTBOX_RETRY_BASE_SECONDS * 2**backoff
+        delay *= random.uniform(0.5, 1.5)
+        await self._run(
+            "UPDATE outbox SET state = ?, attempts = ?, last_error = ?, "
+            "next_attempt_at = ? WHERE id = ?",
+            (state.value, attempts, error, time.time() + delay, job.id),
+        )
+
+    async def defer(self, job: OutboxJob, delay: float, reason: str) -> None:
+        """Puts a claimed job back for later without spending one of its attempts."""
+        state = OutboxState.PENDING if job.state == OutboxState.SENDING else job.state
+        await self._run(
+            "UPDATE outbox SET state = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+            (state.value, reason, time.time() + delay, job.id),
+        )
+
+    async def wait(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def stats(self) -> OutboxStats:
+        rows = await self._run("SELECT state, COUNT(*) FROM outbox GROUP BY state")
+        counts = {state: count for state, count in rows}
+
+        cutoff = time.monotonic() - _RATE_WINDOW_SECONDS
+        while self._delivered and self._delivered[0] < cutoff:
+            self._delivered.popleft()
+
+        return OutboxStats(
+            depth=counts.get(OutboxState.PENDING.value, 0),
+            in_flight=counts.get(OutboxState.SENDING.value, 0)
+            + counts.get(OutboxState.SENT.value, 0),
+            failed=counts.get(OutboxState.FAILED.value, 0),
+            delivered_total=self._delivered_total,
+            drain_rate_per_minute=len(self._delivered) * 60.0 / _RATE_WINDOW_SECONDS,
+        )
+
+
+def _to_job(row: tuple) -> OutboxJob:
+    return OutboxJob(
+        id=row[0],
+        mail_hash=row[1],
+        template_id=row[2],
+        to_email=json.loads(row[3]),
+        sender=row[4],
+        subject=row[5],
+        content=row[6],
+        reply_to=row[7],
+        state=OutboxState(row[8]),
+        attempts=row[9],
+        last_error=row[10],
+        entity_id=row[11],
+        delivery_id=row[12],
+    )
+
+
+class OutboxWorkerPool:
+    """A fixed pool of async workers draining the outbox."""
+
+    def __init__(self, outbox: Outbox) -> None:
+        self.outbox = outbox
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self, workers: int) -> None:
+        for i in range(workers):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            jobs = await self.outbox.claim(settings.OUTBOX_BATCH_SIZE)
+            if not jobs:
+                await self.outbox.wait(settings.OUTBOX_POLL_SECONDS)
+                continue
+            try:
+                await self.process(jobs)
+            except asyncio.CancelledError:
+                raise
+            except CircuitOpenError as e:
+                # The transport is known to be down; wait for it without using up attempts
+                for job in jobs:
+                    if job.state in (OutboxState.SENDING, OutboxState.SENT):
+                        await self.outbox.defer(job, e.retry_after, str(e))
+            except Exception as e:
+                logger.warning(f"outbox batch failed on worker {n}: {e}")
+                for job in jobs:
+                    if job.state in (OutboxState.SENDING, OutboxState.SENT):
+                        await self.outbox.retry(job, str(e))
+
+    async def process(self, jobs: List[OutboxJob]) -> None:
+        to_send = [job for job in jobs if job.state == OutboxState.SENDING]
+        if len(to_send) == 1:
+            await mail_sender.send_mail(
+                to_email=to_send[0].to_email,
+                sender=to_send[0].sender,
+                subject=to_send[0].subject,
+                content=to_send[0].content,
+                reply_to=to_send[0].reply_to,
+            )
+            results: List[Optional[Exception]] = [None]
+        elif to_send:
+            results = await mail_sender.send_batch(list(to_send))
+        else:
+            results = []
+        if len(results) < len(to_send):
+            # A job left without a result would stay in `sending` until a restart
+            missing = RuntimeError("the transport returned no result for this mail")
+            results = [*results, *(missing for _ in range(len(to_send) - len(results)))]
+
+        for job, error in zip(to_send, results):
+            if error is None:
+                await self.outbox.mark(job.id, OutboxState.SENT)
+                job.state = OutboxState.SENT
+            elif isinstance(error, CircuitOpenError):
+                await self.outbox.defer(job, error.retry_after, str(error))
+                job.state = OutboxState.PENDING
+            else:
+                logger.warning(f"outbox job {job.id} was not delivered: {error}")
+                await self.outbox.retry(job, str(error))
+                job.state = OutboxState.PENDING
+
+        for job in jobs:
+            if job.state != OutboxState.SENT:
+                continue
+            # The (mail_hash, template_id) pair is the dedupe key, so checking it first
+            # keeps the log exactly-once even if a previous attempt died after the write.
+            # Fan-out jobs share the pair, so the index spares all but the first PB lookup.
+            sent_at = datetime.now(timezone.utc)
+            if not await eligibility.has_sent(
+                job.mail_hash, job.template_id
+            ) and not await repository.has_sent_template(job.mail_hash, job.template_id):
+                await repository.create_sent_log(job.mail_hash, job.template_id, sent_at)
+            await eligibility.record(job.mail_hash, job.template_id, sent_at)
+            await self.outbox.mark(job.id, OutboxState.LOGGED)
+            job.state = OutboxState.LOGGED
+
+
+outbox = Outbox(settings.OUTBOX_DB_PATH)
+outbox_workers = OutboxWorkerPool(outbox)
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.api.models import (
+    AuthAttempt,
+    AuthState,
+    Entity,
+    EntityType,
+    SentMailLog,
+    Template,
+)
+from app.core.config import settings
+from app.services.pb_service import PBClient, PBError, pb, quote
+
+logger = logging.getLogger(__name__)
+
+_ENTITY_WRITE_EXCLUDE = {"id", "created", "updated"}
+
+# What a successful entity write of each method counts as in a sync report
+_WRITE_KINDS = {"POST": "created", "PATCH": "updated", "DELETE": "deleted"}
+
+
+class PBRepository:
+    """
+    Typed, async access to the PocketBase collections used by the backend.
+    Every service goes through here instead of issuing raw record calls.
+    """
+
+    def __init__(self, client: PBClient) -> None:
+        self.client = client
+        # Flipped off the first time PocketBase refuses /api/batch (disabled or too old)
+        self.batch_supported = True
+
+    # --- template ---
+
+    async def get_templates(self) -> List[Template]:
+        records = await self.client.get_full_list(
+            "template", expand="target_entities"
+        )
+        return [Template.from_record(r) for r in records]
+
+    async def get_template(self, template_id: str) -> Template:
+        record = await self.client.get_one(
+            "template", template_id, expand="target_entities"
+        )
+        return Template.from_record(record)
+
+    # --- entity ---
+
+    async def get_entity(self, entity_id: str) -> Entity:
+        record = await self.client.get_one("entity", entity_id)
+        return Entity.from_record(record)
+
+    async def get_entities(
+        self, ent_types: Optional[Sequence[EntityType]] = None
+    ) -> List[Entity]:
+        records = await self.client.get_full_list(
+            "entity", batch=300, filter=_ent_type_filter(ent_types)
+        )
+        return [Entity.from_record(r) for r in records]
+
+    async def has_entities(self) -> bool:
+        result = await self.client.get_list("entity", 1, 1, fields="id")
+        return bool(result["items"])
+
+    async def get_entities_by_email(
+        self, emails: Sequence[str], ent_types: Optional[Sequence[EntityType]] = None
+    ) -> List[Entity]:
+        if not emails:
+            return []
+        filter = " || ".join(f'email = "{quote(e)}"' for e in emails)
+        type_filter = _ent_type_filter(ent_types)
+        if type_filter:
+            filter = f"({filter}) && ({type_filter})"
+        records = await self.client.get_full_list(
+            "entity", batch=len(emails), filter=filter
+        )
+        return [Entity.from_record(r) for r in records]
+
+    async def get_entity_emails(
+        self, ent_types: Optional[Sequence[EntityType]] = None
+    ) -> Dict[str, str]:
+        """Returns id -> email for the entities, without loading full records."""
+        records = await self.client.get_full_list(
+            "entity", batch=500, filter=_ent_type_filter(ent_types), fields="id,email"
+        )
+        return {r["id"]: r["email"] for r in records}
+
+    async def create_entity(self, entity: Entity) -> Entity:
+        record = await self.client.create("entity", _entity_body(entity))
+        return Entity.from_record(record)
+
+    async def update_entity(self, entity_id: str, entity: Entity) -> Entity:
+        record = await self.client.update("entity", entity_id, _entity_body(entity))
+        return Entity.from_record(record)
+
+    async def delete_entity(self, entity_id: str) -> None:
+        await self.client.delete("entity", entity_id)
+
+    async def write_entities(
+        self,
+        creates: Sequence[Entity] = (),
+        updates: Sequence[Tuple[str, Entity]] = (),
+        deletes: Sequence[str] = (),
+    ) -> Counter[str]:
+        """
+        Applies entity changes in PocketBase batch requests, falling back to
+        concurrent single-record calls. Returns how many operations succeeded per
+        kind ("created", "updated", "deleted") and how many "failed".
+        """
+        base = "/api/collections/entity/records"
+        ops: List[Dict[str, Any]] = []
+        for entity in creates:
+            ops.append({"method": "POST", "url": base, "body": _entity_body(entity)})
+        for entity_id, entity in updates:
+            ops.append(
+                {"method": "PATCH", "url": f"{base}/{entity_id}", "body": _entity_body(entity)}
+            )
+        for entity_id in deletes:
+            ops.append({"method": "DELETE", "url": f"{base}/{entity_id}"})
+
+        size = settings.POCKETBASE_BATCH_SIZE
+        chunks = [ops[i : i + size] for i in range(0, len(ops), size)]
+        counts: Counter[str] = Counter()
+        for chunk_counts in await asyncio.gather(*(self._write_chunk(c) for c in chunks)):
+            counts.update(chunk_counts)
+        return counts
+
+    async def _write_chunk(self, ops: List[Dict[str, Any]]) -> Counter[str]:
+        if self.batch_supported:
+            try:
+                await self.client.batch(ops)
+                return Counter(_WRITE_KINDS[op["method"]] for op in ops)
+            except PBError as e:
+                if e.status in (403, 404):
+                    logger.info("PocketBase batch API unavailable, using single requests")
+                    self.batch_supported = False
+                else:
+                    # The batch is transactional; retry one by one to isolate the failure
+                    logger.warning(f"entity batch failed, retrying individually: {e}")
+
+        semaphore = asyncio.Semaphore(settings.POCKETBASE_WRITE_CONCURRENCY)
+
+        async def _single(op: Dict[str, Any]) -> str:
+            async with semaphore:
+                try:
+                    await self.client.request(op["method"], op["url"], json=op.get("body"))
+                    return _WRITE_KINDS[op["method"]]
+                except Exception as e:
+                    logger.error(f"failed to {op['method']} {op['url']}: {e}")
+                    return "failed"
+
+        return Counter(await asyncio.gather(*(_single(op) for op in ops)))
+
+    # --- auth_attempt ---
+
+    async def create_auth_attempt(
+        self,
+        mail_hash: str,
+        code: int,
+        expires: datetime,
+        attempt_id: Optional[str] = None,
+    ) -> AuthAttempt:
+        data = {
+            "user_mail_hash": mail_hash,
+            "code": code,
+            "expires": expires.isoformat(),
+            "state": AuthState.SENT.value,
+        }
+        if attempt_id is not None:
+            data["id"] = attempt_id
+        record = await self.client.create("auth_attempt", data)
+        return AuthAttempt.from_record(record)
+
+    async def set_auth_attempt_state(self, attempt_id: str, state: AuthState) -> None:
+        await self.client.update("auth_attempt", attempt_id, {"state": state.value})
+
+    # --- sent_mail_logs ---
+
+    async def has_sent_since(self, mail_hash: str, since: datetime) -> bool:
+        record = await self.client.get_first(
+            "sent_mail_logs",
+            filter=f'user_mail_hash = "{quote(mail_hash)}" && created > "{since.isoformat()}"',
+            fields="id",
+        )
+        return record is not None
+
+    async def has_sent_template(self, mail_hash: str, template_id: str) -> bool:
+        record = await self.client.get_first(
+            "sent_mail_logs",
+            filter=f'user_mail_hash = "{quote(mail_hash)}" && template_id = "{quote(template_id)}"',
+            fields="id",
+        )
+        return record is not None
+
+    async def get_sent_logs(self) -> List[SentMailLog]:
+        records = await self.client.get_full_list(
+            "sent_mail_logs", fields="id,user_mail_hash,template_id,created"
+        )
+        return [SentMailLog.from_record(r) for r in records]
+
+    async def create_sent_log(
+        self, mail_hash: str, template_id: str, created: datetime
+    ) -> None:
+        await self.client.create(
+            "sent_mail_logs",
+            {
+                "user_mail_hash": mail_hash,
+                "template_id": template_id,
+                "created": created.isoformat(),
+            },
+        )
+
+
+def _ent_type_filter(ent_types: Optional[Sequence[EntityType]]) -> Optional[str]:
+    if not ent_types:
+        return None
+    return " || ".join(f'ent_type = "{t.value}"' for t in ent_types)
+
+
+def _entity_body(entity: Entity) -> Dict[str, Any]:
+    return entity.model_dump(mode="json", exclude=_ENTITY_WRITE_EXCLUDE)
+
+
+repository = PBRepository(pb)
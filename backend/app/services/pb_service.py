@@ -1,14 +1,297 @@
-from pocketbase import PocketBase
+import asyncio
+import base64
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.circuit_breaker import DependencyUnavailable, circuit_breaker
+
+logger = logging.getLogger(__name__)
+
+
+class PBError(Exception):
+    """Raised when PocketBase answers with a non-2xx status."""
+
+    def __init__(self, status: int, url: str, data: Any = None) -> None:
+        super().__init__(f"PocketBase request {url} failed with {status}: {data}")
+        self.status = status
+        self.url = url
+        self.data = data
+
+
+class PBClient:
+    """
+    Thin async client for the PocketBase REST API.
+
+    A single pooled `httpx.AsyncClient` with keep-alive is shared by every request.
+    Nothing touches the network until the first request: the HTTP client is created
+    by `open()` (called from the app lifespan, or on first use) and the superuser token
+    is obtained lazily, renewed shortly before it expires and again on a 401.
+    Every call goes through the `pocketbase` circuit breaker.
+    """
+
+    def __init__(self) -> None:
+        self.base_url = settings.POCKETBASE_URL.rstrip("/")
+        self.client: Optional[httpx.AsyncClient] = None
+        self._token: Optional[str] = None
+        self._refresh_at = 0.0
+        self._auth_lock = asyncio.Lock()
+        self.breaker = circuit_breaker(
+            "pocketbase",
+            timeout=settings.POCKETBASE_CALL_TIMEOUT,
+            is_failure=lambda e: isinstance(e, httpx.TransportError),
+        )
+
+    def open(self) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=settings.POCKETBASE_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.POCKETBASE_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.POCKETBASE_MAX_CONNECTIONS,
+                ),
+            )
+        return self.client
+
+    async def authenticate(self, stale: Optional[str] = None) -> None:
+        """
+        Obtains a superuser token. If another caller already replaced `stale`
+        (the token the caller found unusable) while we waited, that one is kept.
+        """
+        async with self._auth_lock:
+            if self._token is not None and self._token != stale:
+                return
+            with metrics.span("pocketbase", "POST auth") as span:
+                async with self.breaker.guard() as attempt:
+                    response = await self.open().post(
+                        "/api/collections/_superusers/auth-with-password",
+                        json={
+                            "identity": settings.POCKETBASE_ADMIN,
+                            "password": settings.POCKETBASE_ADMIN_PW,
+                        },
+                    )
+                    attempt.failed = _overloaded(response)
+                span.error = response.is_error
+            if response.is_error:
+                raise PBError(response.status_code, str(response.url), _safe_json(response))
+            self._token = response.json()["token"]
+            expires = _token_expiry(self._token)
+            if expires is None:
+                # Unknown lifetime, rely on the 401 retry
+                self._refresh_at = float("inf")
+            else:
+                # Short-lived tokens are renewed halfway through instead
+                margin = min(
+                    settings.POCKETBASE_TOKEN_REFRESH_MARGIN, (expires - time.time()) / 2
+                )
+                self._refresh_at = expires - margin
+            logger.info("authenticated to PocketBase as %s", settings.POCKETBASE_ADMIN)
+
+    async def health(self) -> bool:
+        """True if PocketBase answers its public health endpoint."""
+        try:
+            response = await self.open().get(
+                "/api/health", timeout=settings.HEALTH_CHECK_TIMEOUT
+            )
+        except httpx.HTTPError:
+            return False
+        return response.is_success
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Any] = None,
+    ) -> Any:
+        if self._token is None or time.time() >= self._refresh_at:
+            await self.authenticate(stale=self._token)
+
+        token = self._token
+        response = await self._send(method, path, params, json)
+        if response.status_code == 401:
+            await self.authenticate(stale=token)
+            response = await self._send(method, path, params, json)
+
+        if response.is_error:
+            raise PBError(response.status_code, str(response.url), _safe_json(response))
+        if response.status_code == 204 or not response.content:
+            return None
+        return response.json()
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]],
+        json: Optional[Any],
+    ) -> httpx.Response:
+        headers = {"Authorization": self._token} if self._token else None
+        with metrics.span("pocketbase", _operation(method, path)) as span:
+            async with self.breaker.guard() as attempt:
+                response = await self.open().request(
+                    method, path, params=_clean(params), json=json, headers=headers
+                )
+                attempt.failed = _overloaded(response)
+            span.error = response.is_error
+        return response
+
+    # --- Record helpers ---
+
+    async def get_one(
+        self, collection: str, record_id: str, expand: Optional[str] = None
+    ) -> Dict[str, Any]:
+        return await self.request(
+            "GET",
+            f"/api/collections/{collection}/records/{record_id}",
+            params={"expand": expand},
+        )
+
+    async def get_list(
+        self,
+        collection: str,
+        page: int = 1,
+        per_page: int = 30,
+        filter: Optional[str] = None,
+        sort: Optional[str] = None,
+        expand: Optional[str] = None,
+        fields: Optional[str] = None,
+        skip_total: bool = True,
+    ) -> Dict[str, Any]:
+        return await self.request(
+            "GET",
+            f"/api/collections/{collection}/records",
+            params={
+                "page": page,
+                "perPage": per_page,
+                "filter": filter,
+                "sort": sort,
+                "expand": expand,
+                "fields": fields,
+                "skipTotal": int(skip_total),
+            },
+        )
+
+    async def get_first(
+        self,
+        collection: str,
+        filter: str,
+        sort: Optional[str] = None,
+        fields: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        result = await self.get_list(
+            collection, 1, 1, filter=filter, sort=sort, fields=fields
+        )
+        items = result["items"]
+        return items[0] if items else None
+
+    async def get_full_list(
+        self,
+        collection: str,
+        batch: int = 500,
+        filter: Optional[str] = None,
+        sort: Optional[str] = None,
+        expand: Optional[str] = None,
+        fields: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]] = []
+        page = 1
+        while True:
+            result = await self.get_list(
+                collection,
+                page,
+                batch,
+                filter=filter,
+                sort=sort,
+                expand=expand,
+                fields=fields,
+            )
+            items.extend(result["items"])
+            if len(result["items"]) < batch:
+                return items
+            page += 1
+
+    async def create(self, collection: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.request(
+            "POST", f"/api/collections/{collection}/records", json=body
+        )
+
+    async def update(
+        self, collection: str, record_id: str, body: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        return await self.request(
+            "PATCH", f"/api/collections/{collection}/records/{record_id}", json=body
+        )
+
+    async def delete(self, collection: str, record_id: str) -> None:
+        await self.request(
+            "DELETE", f"/api/collections/{collection}/records/{record_id}"
+        )
+
+    async def batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Runs several record operations in one transactional `/api/batch` call.
+        Each request is a dict with `method`, `url` and optional `body`.
+        """
+        return await self.request("POST", "/api/batch", json={"requests": requests})
+
+    async def aclose(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+def is_outage(exc: BaseException) -> bool:
+    """True for errors that mean PocketBase is down or overloaded, not that the call was wrong."""
+    if isinstance(exc, PBError):
+        return exc.status >= 500 or exc.status == 429
+    return isinstance(exc, (DependencyUnavailable, httpx.TransportError))
+
+
+def _overloaded(response: httpx.Response) -> bool:
+    return response.is_server_error or response.status_code == 429
+
+
+def _clean(params: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if params is None:
+        return None
+    return {k: v for k, v in params.items() if v is not None}
+
+
+def _operation(method: str, path: str) -> str:
+    """Metric label for a request: the collection, not the record id."""
+    parts = path.strip("/").split("/")
+    if len(parts) >= 3 and parts[:2] == ["api", "collections"]:
+        return f"{method} {parts[2]}"
+    return f"{method} {path}"
+
+
+def _token_expiry(token: str) -> Optional[float]:
+    """Reads the `exp` claim of a JWT without verifying it."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _safe_json(response: httpx.Response) -> Any:
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
 
 
-def get_pb_client():
-    return PocketBase(settings.POCKETBASE_URL)
+def quote(value: str) -> str:
+    """Escapes a value for use inside a double-quoted PocketBase filter literal."""
+    return value.replace("\\", "\\\\").replace('"', '\\"')
 
 
-pb = get_pb_client()
-print("user:", settings.POCKETBASE_ADMIN)
-pb.collection("_superusers").auth_with_password(
-    username_or_email=settings.POCKETBASE_ADMIN,
-    password=settings.POCKETBASE_ADMIN_PW,
-)
+pb = PBClient()
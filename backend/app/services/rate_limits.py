@@ -0,0 +1,42 @@
+import logging
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.services.shared_state import shared_state
+
+logger = logging.getLogger(__name__)
+
+
+class OTPRequestLimiter:
+    """
+    Abuse limits for OTP requests on top of the per-mail send rules:
+    how many distinct mail addresses one client IP may use, and how often
+    a single mail address may ask for a code, each within a sliding window.
+    """
+
+    def __init__(self, state: Any) -> None:
+        self.state = state
+
+    async def check(self, ip: str, mail_hash: str) -> Optional[float]:
+        """Records the request. Returns None if allowed, else seconds until retry."""
+        per_ip = await self.state.hit(
+            f"otp:ip:{ip}",
+            settings.OTP_IP_LIMIT,
+            settings.OTP_IP_WINDOW_SECONDS,
+            member=mail_hash,
+        )
+        if not per_ip.allowed:
+            logger.info(f"OTP request from {ip} refused, {per_ip.count} addresses in window")
+            return per_ip.retry_after
+
+        per_hash = await self.state.hit(
+            f"otp:hash:{mail_hash}",
+            settings.OTP_HASH_LIMIT,
+            settings.OTP_HASH_WINDOW_SECONDS,
+        )
+        if not per_hash.allowed:
+            return per_hash.retry_after
+        return None
+
+
+otp_limiter = OTPRequestLimiter(shared_state)
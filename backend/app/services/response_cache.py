@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def item_hash(item: Any) -> str:
+    """Stable hash of a decoded JSON value, used to spot changed list entries."""
+    return content_hash(json.dumps(item, sort_keys=True, ensure_ascii=False).encode())
+
+
+class CachedResponse:
+    __slots__ = ("etag", "last_modified", "body_hash", "source_hash", "checked_at", "body")
+
+    def __init__(
+        self,
+        body: Any,
+        body_hash: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        source_hash: Optional[str] = None,
+        checked_at: float = 0.0,
+    ) -> None:
+        self.body = body
+        self.body_hash = body_hash
+        self.etag = etag
+        self.last_modified = last_modified
+        self.source_hash = source_hash
+        # When upstream last confirmed the body (epoch seconds), fetched or 304
+        self.checked_at = checked_at
+
+    def validators(self) -> Dict[str, str]:
+        """Headers that make the next request for this endpoint conditional."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    On-disk cache of upstream JSON responses, one file per endpoint.
+
+    Besides the decoded body it keeps the ETag/Last-Modified validators, a hash of
+    the raw payload and, for detail pages, a hash of the list entry they were
+    fetched for (`source_hash`).
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._memory: Dict[str, CachedResponse] = {}
+
+    def _path(self, endpoint: str) -> str:
+        name = hashlib.sha1(endpoint.encode()).hexdigest()
+        return os.path.join(self.directory, name[:2], name + ".json")
+
+    async def get(self, endpoint: str) -> Optional[CachedResponse]:
+        cached = self._memory.get(endpoint)
+        if cached is not None:
+            return cached
+        cached = await asyncio.to_thread(self._read, endpoint)
+        if cached is not None:
+            self._memory[endpoint] = cached
+        return cached
+
+    async def put(self, endpoint: str, cached: CachedResponse) -> None:
+        self._memory[endpoint] = cached
+        await asyncio.to_thread(self._write, endpoint, cached)
+
+    def _read(self, endpoint: str) -> Optional[CachedResponse]:
+        try:
+            with open(self._path(endpoint), encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"ignoring unreadable cache entry for {endpoint}: {e}")
+            return None
+        return CachedResponse(
+            body=data["body"],
+            body_hash=data["body_hash"],
+            etag=data.get("etag"),
+            last_modified=data.get("last_modified"),
+            source_hash=data.get("source_hash"),
+            checked_at=data.get("checked_at", 0.0),
+        )
+
+    def _write(self, endpoint: str, cached: CachedResponse) -> None:
+        path = self._path(endpoint)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "endpoint": endpoint,
+                    "etag": cached.etag,
+                    "last_modified": cached.last_modified,
+                    "body_hash": cached.body_hash,
+                    "source_hash": cached.source_hash,
+                    "checked_at": cached.checked_at,
+                    "body": cached.body,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp, path)
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveScheduler:
+    """
+    Paces requests to an upstream that defends itself against scrapers.
+
+    Concurrency is capped by a semaphore and the request rate by a token bucket.
+    The rate follows AIMD: it grows by `increase` req/s after every fast success and
+    is multiplied by `decrease` on 429, 5xx, transport errors or slow responses.
+    Failed requests are retried with exponential backoff and full jitter.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 5,
+        initial_rate: float = 5.0,
+        min_rate: float = 0.5,
+        max_rate: float = 20.0,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+        latency_threshold: float = 2.0,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+    ) -> None:
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_threshold = latency_threshold
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._bucket_lock = asyncio.Lock()
+
+    async def _take_token(self) -> None:
+        async with self._bucket_lock:
+            while True:
+                now = time.monotonic()
+                # Allow a burst of at most one second worth of requests
+                self._tokens = min(
+                    max(self.rate, 1.0),
+                    self._tokens + (now - self._last_refill) * self.rate,
+                )
+                self._last_refill = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+    def _on_success(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def _on_pressure(self, reason: str) -> None:
+        rate = max(self.min_rate, self.rate * self.decrease)
+        if rate != self.rate:
+            logger.info(f"upstream pressure ({reason}), rate {self.rate:.2f} -> {rate:.2f} req/s")
+        self.rate = rate
+
+    def _backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, self.backoff_base * 2**attempt)
+
+    async def run(
+        self, send: Callable[[], Awaitable[httpx.Response]]
+    ) -> httpx.Response:
+        """
+        Runs `send` under the scheduler's limits, retrying on 429/5xx and transport
+        errors. Returns the last response or raises the last transport error.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._take_token()
+            try:
+                async with self._semaphore:
+                    # Timed from here, so waiting for a local slot isn't upstream latency
+                    started = time.monotonic()
+                    response = await send()
+                    latency = time.monotonic() - started
+            except httpx.TransportError as e:
+                self._on_pressure(type(e).__name__)
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            status = response.status_code
+            if status == 429 or status >= 500:
+                self._on_pressure(f"HTTP {status}")
+                if attempt == self.max_retries:
+                    return response
+                await asyncio.sleep(
+                    self._backoff(attempt, _retry_after(response))
+                )
+                continue
+
+            if latency > self.latency_threshold:
+                self._on_pressure(f"{latency:.1f}s latency")
+            else:
+                self._on_success()
+            return response
+
+        raise AssertionError("unreachable")
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
@@ -0,0 +1,173 @@
+import functools
+import math
+import time
+import uuid
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+
+class WindowResult(NamedTuple):
+    allowed: bool
+    # Hits in the window, including this one if it was allowed
+    count: int
+    # Seconds until the oldest hit leaves the window (0 when allowed)
+    retry_after: float
+
+
+class MemorySharedState:
+    """
+    In-process implementation: correct for a single worker only. Expired keys are
+    dropped lazily on access and by a periodic sweep.
+    """
+
+    def __init__(self, sweep_every: int = 1000) -> None:
+        self._values: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._windows: Dict[str, Tuple[Dict[str, float], float]] = {}
+        self._sweep_every = sweep_every
+        self._ops = 0
+
+    def _tick(self, now: float) -> None:
+        self._ops += 1
+        if self._ops % self._sweep_every == 0:
+            for key in [k for k, (_, exp) in self._values.items() if exp is not None and exp <= now]:
+                del self._values[key]
+            for key in [k for k, (_, exp) in self._windows.items() if exp <= now]:
+                del self._windows[key]
+
+    def _live(self, key: str, now: float) -> Optional[Tuple[Any, Optional[float]]]:
+        entry = self._values.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._values[key]
+            return None
+        return entry
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._live(key, time.time())
+        return None if entry is None else str(entry[0])
+
+    async def set(
+        self, key: str, value: Any, ttl: Optional[float] = None, only_new: bool = False
+    ) -> bool:
+        now = time.time()
+        self._tick(now)
+        if only_new and self._live(key, now) is not None:
+            return False
+        self._values[key] = (value, now + ttl if ttl else None)
+        return True
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.time()
+        self._tick(now)
+        entry = self._live(key, now)
+        if entry is None:
+            entry = (0, now + ttl if ttl else None)
+        value = int(entry[0]) + amount
+        self._values[key] = (value, entry[1])
+        return value
+
+    async def delete(self, key: str) -> None:
+        self._values.pop(key, None)
+        self._windows.pop(key, None)
+
+    async def hit(
+        self, key: str, limit: int, window: float, member: Optional[str] = None
+    ) -> WindowResult:
+        now = time.time()
+        self._tick(now)
+        hits, _ = self._windows.get(key, ({}, 0.0))
+        for m in [m for m, at in hits.items() if at <= now - window]:
+            del hits[m]
+        member = member or uuid.uuid4().hex
+        known = member in hits
+        if not known and len(hits) >= limit:
+            self._windows[key] = (hits, now + window)
+            retry_after = min(hits.values()) + window - now if hits else window
+            return WindowResult(False, len(hits), retry_after)
+        hits[member] = now
+        self._windows[key] = (hits, now + window)
+        return WindowResult(True, len(hits), 0.0)
+
+
+class RedisSharedState:
+    """
+    State shared by every worker and node through Redis. Any client exposing the
+    `redis.asyncio` API (including fakeredis) can be passed in.
+    """
+
+    def __init__(self, client: Any, prefix: str = "state:") -> None:
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(self.prefix + key)
+        return None if value is None else _decode(value)
+
+    async def set(
+        self, key: str, value: Any, ttl: Optional[float] = None, only_new: bool = False
+    ) -> bool:
+        px = int(ttl * 1000) if ttl else None
+        return bool(await self.client.set(self.prefix + key, value, px=px, nx=only_new))
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        key = self.prefix + key
+        async with self.client.pipeline(transaction=True) as pipe:
+            if ttl:
+                # Creates the key with its TTL only the first time
+                pipe.set(key, 0, px=int(ttl * 1000), nx=True)
+            pipe.incrby(key, amount)
+            results = await pipe.execute()
+        return int(results[-1])
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+    async def hit(
+        self, key: str, limit: int, window: float, member: Optional[str] = None
+    ) -> WindowResult:
+        """
+        Sliding-window log in a sorted set. The hit is added optimistically and taken
+        back if it went over the limit, so concurrent callers can only be refused
+        too eagerly, never admitted past the limit.
+        """
+        key = self.prefix + key
+        now = time.time()
+        member = member or uuid.uuid4().hex
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(key, 0, now - window)
+            pipe.zadd(key, {member: now})
+            pipe.zcard(key)
+            pipe.zrange(key, 0, 0, withscores=True)
+            pipe.expire(key, math.ceil(window))
+            _, added, count, oldest, _ = await pipe.execute()
+        # A member already in the window (e.g. the same mail again) was counted before
+        if count <= limit or not added:
+            return WindowResult(True, count, 0.0)
+        if added:
+            await self.client.zrem(key, member)
+            count -= 1
+        retry_after = oldest[0][1] + window - now if oldest else window
+        return WindowResult(False, count, max(0.0, retry_after))
+
+
+def _decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+@functools.cache
+def get_redis() -> Any:
+    """The process-wide Redis client for REDIS_URL, shared by every Redis-backed store."""
+    try:
+        from redis import asyncio as aioredis
+    except ImportError as e:
+        raise RuntimeError("REDIS_URL is set but the `redis` package is not installed") from e
+    return aioredis.from_url(settings.REDIS_URL)
+
+
+def get_shared_state() -> Any:
+    if not settings.REDIS_URL:
+        return MemorySharedState()
+    return RedisSharedState(get_redis())
+
+
+shared_state = get_shared_state()
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import time
+from email.message import EmailMessage
+from typing import List, Optional, Set
+
+import aiosmtplib
+
+from app.core.metrics import metrics
+from app.services.circuit_breaker import circuit_breaker
+
+logger = logging.getLogger(__name__)
+
+# Errors after which a connection can't be trusted anymore
+_CONNECTION_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPTimeoutError,
+    ConnectionError,
+)
+
+
+class _PooledConnection:
+    __slots__ = ("smtp", "sent", "last_used")
+
+    def __init__(self, smtp: aiosmtplib.SMTP) -> None:
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """
+    Bounded pool of long-lived SMTP connections.
+
+    Idle connections are probed with NOOP before reuse once they've been idle for
+    `idle_check_seconds`, retired after `max_messages` sends, and a send that fails on
+    a dropped connection is retried once on a fresh one. Sends go through the `smtp`
+    circuit breaker, which bounds each one by `call_timeout`; a connection that breaks
+    or runs out of time is closed on the spot, only retired ones say QUIT.
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        size: int = 5,
+        max_messages: int = 100,
+        idle_check_seconds: float = 30.0,
+        timeout: float = 30.0,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        start_tls: Optional[bool] = None,
+        call_timeout: Optional[float] = None,
+    ) -> None:
+        self.hostname = hostname
+        self.port = port
+        self.size = size
+        self.max_messages = max_messages
+        self.idle_check_seconds = idle_check_seconds
+        self.timeout = timeout
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self._idle: List[_PooledConnection] = []
+        # Retired connections still saying QUIT, referenced until they finish
+        self._closing: Set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(size)
+        # Refused recipients or content don't mean the server is down
+        self.breaker = circuit_breaker(
+            "smtp",
+            timeout=call_timeout,
+            is_failure=lambda e: isinstance(e, (*_CONNECTION_ERRORS, OSError)),
+        )
+
+    async def send(self, message: EmailMessage) -> None:
+        # The slot first: the deadline covers the server, not waiting for a free connection
+        async with self._slots, self.breaker.guard():
+            with metrics.span("smtp", "send"):
+                try:
+                    await self._send_on(await self._acquire(), message)
+                except _CONNECTION_ERRORS as e:
+                    logger.info(f"SMTP connection dropped ({e}), reconnecting")
+                    await self._send_on(await self._connect(), message)
+
+    async def _send_on(self, conn: _PooledConnection, message: EmailMessage) -> None:
+        """Sends over `conn`, then returns it to the pool unless it broke."""
+        try:
+            await conn.smtp.send_message(message)
+        except _CONNECTION_ERRORS:
+            self._abort(conn)
+            raise
+        except (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused):
+            # The server refused this message and aiosmtplib reset the envelope;
+            # the connection itself is fine
+            self._release(conn)
+            raise
+        except BaseException:
+            # Timed out or cancelled mid-send: the server may never answer a QUIT either
+            self._abort(conn)
+            raise
+        self._release(conn)
+
+    async def _acquire(self) -> _PooledConnection:
+        while self._idle:
+            conn = self._idle.pop()
+            try:
+                healthy = await self._healthy(conn)
+            except BaseException:
+                self._abort(conn)
+                raise
+            if healthy:
+                return conn
+            self._abort(conn)
+        return await self._connect()
+
+    async def _healthy(self, conn: _PooledConnection) -> bool:
+        if not conn.smtp.is_connected:
+            return False
+        if time.monotonic() - conn.last_used < self.idle_check_seconds:
+            return True
+        try:
+            await conn.smtp.noop()
+            return True
+        except (aiosmtplib.SMTPException, ConnectionError):
+            return False
+
+    async def _connect(self) -> _PooledConnection:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            timeout=self.timeout,
+            start_tls=self.start_tls,
+            username=self.username or None,
+            password=self.password or None,
+        )
+        await smtp.connect()
+        return _PooledConnection(smtp)
+
+    def _release(self, conn: _PooledConnection) -> None:
+        conn.sent += 1
+        conn.last_used = time.monotonic()
+        if conn.sent >= self.max_messages:
+            task = asyncio.create_task(self._discard(conn))
+            self._closing.add(task)
+            task.add_done_callback(self._closed)
+            return
+        self._idle.append(conn)
+
+    @staticmethod
+    def _abort(conn: _PooledConnection) -> None:
+        """Drops a broken or stuck connection without waiting on the server."""
+        if conn.smtp.is_connected:
+            conn.smtp.close()
+
+    async def _discard(self, conn: _PooledConnection) -> None:
+        """Says QUIT on a connection retired in good order."""
+        if not conn.smtp.is_connected:
+            return
+        try:
+            await conn.smtp.quit()
+        except (aiosmtplib.SMTPException, ConnectionError):
+            conn.smtp.close()
+
+    def _closed(self, task: asyncio.Task) -> None:
+        self._closing.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"could not close a retired SMTP connection: {task.exception()}")
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        await asyncio.gather(
+            *(self._discard(c) for c in idle), *self._closing, return_exceptions=True
+        )
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from app.api.models import SyncJob, SyncJobState
+from app.core.profiling import profiler
+from app.services.entity_maintainer import EntityMaintainer, entity_maintainer
+from app.services.pb_repository import repository
+
+logger = logging.getLogger(__name__)
+
+
+class SyncBusy(Exception):
+    """A sync of a different kind is already running."""
+
+    def __init__(self, job: SyncJob) -> None:
+        super().__init__(f"sync job {job.id} is already running")
+        self.job = job
+
+
+class SyncJobRunner:
+    """
+    Runs entity syncs in the background. Only one sync runs per process: triggers
+    that arrive while one is in flight coalesce onto it and get its job back, as
+    long as they ask for the same kind of run. The last `history` jobs are kept
+    for status queries.
+    """
+
+    def __init__(self, maintainer: EntityMaintainer, history: int = 20) -> None:
+        self.maintainer = maintainer
+        self.history = history
+        self.jobs: "OrderedDict[str, SyncJob]" = OrderedDict()
+        self._current: Optional[SyncJob] = None
+        self._task: Optional[asyncio.Task] = None
+        self._schedule: Optional[asyncio.Task] = None
+        self._warm_start: Optional[asyncio.Task] = None
+
+    def trigger(
+        self,
+        full: bool = False,
+        trigger: str = "manual",
+        profile: bool = False,
+        snapshot: Optional[str] = None,
+    ) -> SyncJob:
+        """
+        With `profile`, the run is recorded by the sampling profiler. With `snapshot`,
+        the entities of that snapshot file are synced instead of scraping. Raises
+        `SyncBusy` if the running sync isn't the kind of run asked for.
+        """
+        current = self._current
+        if current is not None:
+            if (
+                current.full != full
+                or current.snapshot != snapshot
+                or (profile and current.profile is None)
+            ):
+                raise SyncBusy(current)
+            return current
+
+        job = SyncJob(
+            id=uuid.uuid4().hex,
+            state=SyncJobState.RUNNING,
+            trigger=trigger,
+            full=full,
+            started=datetime.now(timezone.utc),
+            snapshot=snapshot,
+        )
+        if profile:
+            job.profile = profiler.profile_name(f"sync {job.id}")
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.history:
+            self.jobs.popitem(last=False)
+        self._current = job
+        self._task = asyncio.create_task(self._run(job))
+        return job
+
+    async def _run(self, job: SyncJob) -> None:
+        if job.profile is None:
+            await self._sync(job)
+            return
+        async with profiler.capture(f"sync {job.id}", name=job.profile):
+            await self._sync(job)
+
+    async def _sync(self, job: SyncJob) -> None:
+        try:
+            if job.snapshot is not None:
+                job.reports = await self.maintainer.replay_snapshot(job.snapshot)
+            else:
+                job.reports = await self.maintainer.run_full_sync(
+                    incremental=False if job.full else None
+                )
+            job.state = SyncJobState.SUCCEEDED
+        except Exception as e:
+            logger.exception(f"sync job {job.id} failed")
+            job.state = SyncJobState.FAILED
+            job.error = str(e)
+        finally:
+            job.progress = self.maintainer.progress.copy()
+            job.finished = datetime.now(timezone.utc)
+            self._current = None
+
+    def get(self, job_id: str) -> Optional[SyncJob]:
+        job = self.jobs.get(job_id)
+        if job is not None and job is self._current:
+            job.progress = self.maintainer.progress.copy()
+        return job
+
+    def list(self) -> List[SyncJob]:
+        return [self.get(job_id) for job_id in reversed(self.jobs)]  # pyright: ignore[reportReturnType]
+
+    def warm_start(self, path: str) -> None:
+        """
+        Replays the snapshot at `path` in the background, but only into an empty
+        `entity` collection: replaying removes whatever the snapshot doesn't hold, so
+        an old snapshot must never roll back what newer syncs stored.
+        """
+        if not os.path.exists(path):
+            logger.info(f"no entity snapshot at {path}, nothing to warm start from")
+            return
+        self._warm_start = asyncio.create_task(self._warm_start_if_empty(path))
+
+    async def _warm_start_if_empty(self, path: str) -> None:
+        try:
+            if await repository.has_entities():
+                logger.info("entities are already stored, not warm starting from the snapshot")
+                return
+        except Exception as e:
+            logger.error(f"could not check for stored entities, not warm starting: {e}")
+            return
+        try:
+            self.trigger(trigger="warm_start", snapshot=path)
+        except SyncBusy as e:
+            logger.info(f"not warm starting: {e}")
+
+    def start_schedule(self, interval_hours: float) -> None:
+        if interval_hours > 0 and self._schedule is None:
+            self._schedule = asyncio.create_task(self._scheduled(interval_hours * 3600))
+
+    async def _scheduled(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.trigger(trigger="scheduled")
+            except SyncBusy as e:
+                logger.info(f"skipping the scheduled sync: {e}")
+
+    async def stop(self) -> None:
+        tasks = [t for t in (self._warm_start, self._schedule, self._task) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._warm_start = None
+        self._schedule = None
+        self._task = None
+
+
+sync_runner = SyncJobRunner(entity_maintainer)
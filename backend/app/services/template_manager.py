@@ -1,37 +1,125 @@
-from typing import List
-from app.services.pb_service import pb
-from app.api.models import Template, Entity
+import logging
+from typing import Dict, List, Mapping, Tuple
+from pydantic import TypeAdapter
+from app.core.config import settings
+from app.core.http_cache import EncodedResponse, make_etag
+from app.services.cache import VersionedCache
+from app.services.pb_repository import repository
+from app.services.pb_service import is_outage
+from app.services.template_renderer import CompiledTemplate, TemplateRenderer
+from app.api.models import Template, Entity, TemplateView
+
+logger = logging.getLogger(__name__)
+
+# Collections whose changes affect what TemplateManager serves
+CACHED_COLLECTIONS = ("template", "entity")
+
+_template_list = TypeAdapter(List[Template])
 
 
 class TemplateManager:
-    @staticmethod
-    def get_templates() -> List[Template]:
-        records = pb.collection("template").get_full_list(
-            query_params={"expand": "target_entities"}
+    def __init__(self) -> None:
+        # While PocketBase is down, reads fall back to the last known good records
+        self.templates: VersionedCache[List[Template]] = VersionedCache(
+            settings.CACHE_TTL_SECONDS, fallback=is_outage
+        )
+        self.template: VersionedCache[Template] = VersionedCache(
+            settings.CACHE_TTL_SECONDS, fallback=is_outage
         )
-        return [Template.model_validate(r) for r in records]
+        self.entity: VersionedCache[Entity] = VersionedCache(
+            settings.CACHE_TTL_SECONDS, fallback=is_outage
+        )
+        self.renderer = TemplateRenderer()
+        # view -> (template list it was built from, encoded response)
+        self._responses: Dict[TemplateView, Tuple[List[Template], EncodedResponse]] = {}
+
+    async def get_templates(self) -> List[Template]:
+        return await self.templates.get_or_load("all", self._load_templates)
 
-    @staticmethod
-    def get_template(template_id: str) -> Template:
-        record = pb.collection("template").get_one(
-            template_id, {"expand": "target_entities"}
+    async def get_templates_response(self, view: TemplateView) -> EncodedResponse:
+        """
+        The template list serialized and compressed once per cached version. The
+        ETag covers the `updated` stamps of the templates and their expanded entities.
+        """
+        templates = await self.get_templates()
+        cached = self._responses.get(view)
+        if cached is not None and cached[0] is templates:
+            return cached[1]
+
+        versions = [view.value]
+        for template in templates:
+            versions += [template.id, template.updated]
+            if template.expand is not None:
+                versions += [(e.id, e.updated) for e in template.expand.target_entities]
+        exclude = {"__all__": {"content"}} if view == TemplateView.SUMMARY else None
+        encoded = EncodedResponse(
+            _template_list.dump_json(templates, exclude=exclude), make_etag(*versions)
         )
-        return Template.model_validate(record)
+        self._responses[view] = (templates, encoded)
+        return encoded
 
-    @staticmethod
-    def fill_template(content: str, **replacers: str) -> str:
-        for target, value in replacers.items():
-            content = content.replace(target, value)
-        return content
+    async def get_template(self, template_id: str) -> Template:
+        try:
+            return await self.template.get_or_load(
+                template_id, lambda: self._load_template(template_id)
+            )
+        except Exception as e:
+            if not is_outage(e):
+                raise
+            # Not loaded on its own before, but the last template list may have it
+            for template in self.templates.last_good("all") or []:
+                if template.id == template_id:
+                    return template
+            raise
 
-    @staticmethod
-    def get_associated_entities(template_id: str) -> List[Entity]:
-        # Assuming target_entities is a relation field in templates
-        template_record = pb.collection("template").get_one(
-            template_id, {"expand": "target_entities"}
+    async def _load_templates(self) -> List[Template]:
+        templates = await repository.get_templates()
+        for template in templates:
+            self.compile(template)
+        return templates
+
+    async def _load_template(self, template_id: str) -> Template:
+        template = await repository.get_template(template_id)
+        self.compile(template)
+        return template
+
+    def compile(self, template: Template) -> CompiledTemplate:
+        """Parses the template content once per (id, updated) pair."""
+        return self.renderer.compile(
+            template.id or "",
+            template.content,
+            template.updated.isoformat() if template.updated else None,
+        )
+
+    def render(self, template: Template, values: Mapping[str, str]) -> str:
+        compiled = self.compile(template)
+        missing = compiled.missing(values)
+        if missing:
+            logger.debug(f"rendering {template.id} without values for {sorted(missing)}")
+        return compiled.render(values)
+
+    async def get_entity(self, entity_id: str) -> Entity:
+        return await self.entity.get_or_load(
+            entity_id, lambda: repository.get_entity(entity_id)
         )
-        entities = template_record.expand.get("target_entities", [])
-        return [Entity.model_validate(e) for e in entities]
+
+    def invalidate(self, collection: str | None = None) -> None:
+        """
+        Drops cached reads. Templates expand their target entities, so an entity
+        change invalidates the template caches as well.
+        """
+        self.templates.invalidate()
+        self.template.invalidate()
+        self._responses.clear()
+        if collection in (None, "entity"):
+            self.entity.invalidate()
+
+    async def get_associated_entities(self, template_id: str) -> List[Entity]:
+        # Assuming target_entities is a relation field in templates
+        template = await self.get_template(template_id)
+        if template.expand is None:
+            return []
+        return template.expand.target_entities
 
 
 template_manager = TemplateManager()
@@ -0,0 +1,103 @@
+import logging
+import re
+from typing import Dict, List, Mapping, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER = re.compile(r"\{([a-z_]+)\}")
+
+# Placeholders the backend knows how to fill. Anything else is left as literal text.
+KNOWN_PLACEHOLDERS = frozenset(
+    {
+        "sender_name",
+        "sender_surname",
+        "user_name",
+        "user_surname",
+        "sender_domain",
+        "entity_name",
+    }
+)
+
+
+class CompiledTemplate:
+    """
+    A template pre-split into literal chunks and placeholder slots.
+    `segments` alternates literal, slot, literal, ... so rendering is a single join.
+    """
+
+    __slots__ = ("segments", "placeholders", "unknown")
+
+    def __init__(self, content: str) -> None:
+        parts = PLACEHOLDER.split(content)
+        segments: List[str] = [parts[0]]
+        placeholders: Set[str] = set()
+        unknown: Set[str] = set()
+        for i in range(1, len(parts), 2):
+            name, literal = parts[i], parts[i + 1]
+            if name in KNOWN_PLACEHOLDERS:
+                placeholders.add(name)
+                segments.extend((name, literal))
+            else:
+                # Fold unknown placeholders back into the preceding literal
+                unknown.add(name)
+                segments[-1] += "{" + name + "}" + literal
+        self.segments = segments
+        self.placeholders = frozenset(placeholders)
+        self.unknown = frozenset(unknown)
+
+    def missing(self, values: Mapping[str, str]) -> Set[str]:
+        return {p for p in self.placeholders if p not in values}
+
+    def render(self, values: Mapping[str, str]) -> str:
+        segments = self.segments
+        if len(segments) == 1:
+            return segments[0]
+        out = segments[:]
+        for i in range(1, len(out), 2):
+            name = out[i]
+            out[i] = values.get(name, "{" + name + "}")
+        return "".join(out)
+
+
+class TemplateRenderer:
+    """Compiles templates once per (id, updated) and renders them on demand."""
+
+    def __init__(self) -> None:
+        self._compiled: Dict[str, tuple[Optional[str], CompiledTemplate]] = {}
+
+    def compile(
+        self, template_id: str, content: str, updated: Optional[str] = None
+    ) -> CompiledTemplate:
+        cached = self._compiled.get(template_id)
+        if cached is not None and cached[0] == updated:
+            return cached[1]
+
+        compiled = CompiledTemplate(content)
+        if compiled.unknown:
+            logger.warning(
+                f"template {template_id} has unknown placeholders: {sorted(compiled.unknown)}"
+            )
+        self._compiled[template_id] = (updated, compiled)
+        return compiled
+
+    def invalidate(self) -> None:
+        self._compiled.clear()
+
+
+def placeholder_values(
+    name: str,
+    surname: str,
+    entity_name: str,
+    mail: Optional[str] = None,
+) -> Dict[str, str]:
+    """Builds the placeholder mapping shared by preview and send."""
+    values = {
+        "sender_name": name,
+        "sender_surname": surname,
+        "user_name": name,
+        "user_surname": surname,
+        "entity_name": entity_name,
+    }
+    if mail is not None:
+        values["sender_domain"] = mail.split("@")[1]
+    return values
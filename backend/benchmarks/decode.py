@@ -0,0 +1,114 @@
+"""
+Per-record cost of turning PocketBase records into models.
+
+    python -m benchmarks.decode [--records 2000] [--repeat 5] [--output FILE]
+
+Compares full validation (`model_validate`) with the trusted path
+(`PBBaseModel.from_record`) for the record shapes the repository reads.
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.api.models import AuthAttempt, Entity, SentMailLog, Template
+
+_TIMESTAMP = "2024-01-01 10:00:00.000Z"
+
+
+def _entity(i: int) -> Dict[str, Any]:
+    return {
+        "id": f"e{i:014d}",
+        "collectionId": "pbc_entity",
+        "collectionName": "entity",
+        "created": _TIMESTAMP,
+        "updated": _TIMESTAMP,
+        "name": f"Народен представител {i}",
+        "email": f"mp{i}@parliament.bg",
+        "ent_type": "mp",
+        "ent_source": f"https://parliament.bg/api/v1/mp-profile/bg/{i}",
+    }
+
+
+def _template(i: int, targets: int) -> Dict[str, Any]:
+    entities = [_entity(i * targets + j) for j in range(targets)]
+    return {
+        "id": f"t{i:014d}",
+        "collectionId": "pbc_template",
+        "collectionName": "template",
+        "created": _TIMESTAMP,
+        "updated": _TIMESTAMP,
+        "name": f"Шаблон {i}",
+        "content": "<p>Уважаеми {entity_name},</p>" * 40,
+        "target_entities": [e["id"] for e in entities],
+        "expand": {"target_entities": entities},
+    }
+
+
+SHAPES: Dict[str, Callable[[int], Dict[str, Any]]] = {
+    "entity": _entity,
+    "template(5 entities)": lambda i: _template(i, 5),
+    "sent_mail_log": lambda i: {
+        "id": f"s{i:014d}",
+        "user_mail_hash": f"{i:064x}",
+        "template_id": "t00000000000001",
+        "created": _TIMESTAMP,
+    },
+    "auth_attempt": lambda i: {
+        "id": f"a{i:014d}",
+        "created": _TIMESTAMP,
+        "updated": _TIMESTAMP,
+        "user_mail_hash": f"{i:064x}",
+        "code": 123456,
+        "expires": _TIMESTAMP,
+        "state": "sent",
+    },
+}
+MODELS = {
+    "entity": Entity,
+    "template(5 entities)": Template,
+    "sent_mail_log": SentMailLog,
+    "auth_attempt": AuthAttempt,
+}
+
+
+def _best(decode: Callable[[Dict[str, Any]], Any], records: List[Dict[str, Any]], repeat: int) -> float:
+    """Best per-record time in microseconds over `repeat` passes."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for record in records:
+            decode(record)
+        best = min(best, time.perf_counter() - started)
+    return best / len(records) * 1e6
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'record':<22} {'validate µs':>12} {'trusted µs':>12} {'speedup':>8}")
+    for name, make in SHAPES.items():
+        model = MODELS[name]
+        records = [make(i) for i in range(args.records)]
+        # Both paths must agree before their speed is worth comparing
+        assert model.from_record(records[0]) == model.model_validate(records[0])
+        validated = _best(model.model_validate, records, args.repeat)
+        trusted = _best(model.from_record, records, args.repeat)
+        results[name] = {"validate_us": round(validated, 3), "trusted_us": round(trusted, 3)}
+        print(f"{name:<22} {validated:>12.2f} {trusted:>12.2f} {validated / trusted:>7.1f}x")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
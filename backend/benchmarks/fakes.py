@@ -0,0 +1,243 @@
+"""
+In-process stand-ins for the services the backend talks to.
+
+`FakePocketBase` and `FakeParliament` are httpx transports, so they are installed by
+swapping the `httpx.AsyncClient` of the corresponding app client. `SMTPSink` is a
+real SMTP server on localhost (aiosmtpd) that accepts and counts every message.
+"""
+
+import asyncio
+import itertools
+import json
+import re
+import socket
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+_TIMESTAMP = "2024-01-01 00:00:00.000Z"
+_COMPARISON = re.compile(r'(\w+)\s*(>=|<=|!=|>|<|=)\s*"((?:[^"\\]|\\.)*)"')
+_OPERATORS: Dict[str, Callable[[str, str], bool]] = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+}
+
+
+def _compile_filter(expression: str) -> Callable[[Dict[str, Any]], bool]:
+    """
+    Compiles the subset of the PocketBase filter syntax the repository uses:
+    `field op "literal"` comparisons joined by `&&`, `||` and parentheses.
+    """
+    comparisons = []
+
+    def placeholder(match: re.Match) -> str:
+        value = match.group(3).replace('\\"', '"').replace("\\\\", "\\")
+        comparisons.append((match.group(1), _OPERATORS[match.group(2)], value))
+        return f"_c({len(comparisons) - 1})"
+
+    source = _COMPARISON.sub(placeholder, expression)
+    source = source.replace("&&", " and ").replace("||", " or ")
+    if not re.fullmatch(r"[\s()]*(?:_c\(\d+\)|and|or|[\s()])*", source):
+        raise ValueError(f"unsupported filter: {expression}")
+    code = compile(source, "<filter>", "eval")
+
+    def matches(record: Dict[str, Any]) -> bool:
+        def _c(index: int) -> bool:
+            field, op, value = comparisons[index]
+            return op(str(record.get(field, "")), value)
+
+        return eval(code, {"__builtins__": {}, "_c": _c})
+
+    return matches
+
+
+class FakePocketBase:
+    """
+    PocketBase-compatible REST stub covering the calls made by `PBClient`:
+    superuser auth, record CRUD, filtered/paged lists, `expand=target_entities`
+    and `/api/batch`. `latency` adds a per-request delay to mimic the network hop.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.collections: Dict[str, Dict[str, Dict[str, Any]]] = {
+            "template": {},
+            "entity": {},
+            "auth_attempt": {},
+            "sent_mail_logs": {},
+        }
+        self.calls = 0
+        self._ids = itertools.count(1)
+
+    def transport(self) -> httpx.AsyncBaseTransport:
+        return httpx.MockTransport(self.handler)
+
+    def add(self, collection: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        record = {"created": _TIMESTAMP, "updated": _TIMESTAMP, **record}
+        record.setdefault("id", f"r{next(self._ids):014d}")
+        self.collections[collection][record["id"]] = record
+        return record
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._dispatch(request.method, request.url, _body(request.content))
+
+    def _dispatch(self, method: str, url: httpx.URL, body: Any) -> httpx.Response:
+        path = url.path
+        if path == "/api/health":
+            return httpx.Response(200, json={"code": 200, "message": "API is healthy."})
+        if path.endswith("/auth-with-password"):
+            return httpx.Response(200, json={"token": "bench-token", "record": {}})
+        if path == "/api/batch":
+            results = []
+            for sub in body["requests"]:
+                response = self._dispatch(
+                    sub["method"], httpx.URL("http://pb" + sub["url"]), sub.get("body")
+                )
+                results.append(
+                    {"status": response.status_code, "body": _body(response.content)}
+                )
+            return httpx.Response(200, json=results)
+
+        match = re.fullmatch(r"/api/collections/(\w+)/records(?:/(\w+))?", path)
+        if match is None or match.group(1) not in self.collections:
+            return httpx.Response(404, json={"message": "not found"})
+        records = self.collections[match.group(1)]
+        record_id = match.group(2)
+
+        if method == "GET" and record_id:
+            if record_id not in records:
+                return httpx.Response(404, json={"message": "not found"})
+            return httpx.Response(200, json=self._expand(records[record_id], url))
+        if method == "GET":
+            return httpx.Response(200, json=self._list(records, url))
+        if method == "POST":
+            return httpx.Response(200, json=self.add(match.group(1), body))
+        if record_id not in records:
+            return httpx.Response(404, json={"message": "not found"})
+        if method == "PATCH":
+            records[record_id].update(body, updated=_TIMESTAMP)
+            return httpx.Response(200, json=records[record_id])
+        if method == "DELETE":
+            del records[record_id]
+            return httpx.Response(204)
+        return httpx.Response(405)
+
+    def _list(self, records: Dict[str, Dict[str, Any]], url: httpx.URL) -> Dict[str, Any]:
+        items = list(records.values())
+        expression = url.params.get("filter")
+        if expression:
+            matches = _compile_filter(expression)
+            items = [item for item in items if matches(item)]
+        page = int(url.params.get("page", 1))
+        per_page = int(url.params.get("perPage", 30))
+        window = items[(page - 1) * per_page : page * per_page]
+        return {
+            "page": page,
+            "perPage": per_page,
+            "totalItems": -1,
+            "totalPages": -1,
+            "items": [self._expand(item, url) for item in window],
+        }
+
+    def _expand(self, record: Dict[str, Any], url: httpx.URL) -> Dict[str, Any]:
+        if url.params.get("expand") != "target_entities":
+            return record
+        entities = self.collections["entity"]
+        expanded = [entities[i] for i in record.get("target_entities", []) if i in entities]
+        return {**record, "expand": {"target_entities": expanded}}
+
+
+class FakeParliament:
+    """Stub for the parliament.bg endpoints scraped by `EntityMaintainer`."""
+
+    def __init__(self, mps: int = 240, committees: int = 25, latency: float = 0.0) -> None:
+        self.mps = mps
+        self.committees = committees
+        self.latency = latency
+        self.calls = 0
+
+    def transport(self) -> httpx.AsyncBaseTransport:
+        return httpx.MockTransport(self.handler)
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        path = request.url.path
+        if path.endswith("/coll-list-ns/bg"):
+            return httpx.Response(
+                200,
+                json={
+                    "colListMP": [
+                        {
+                            "A_ns_MP_id": i,
+                            "A_ns_MPL_Name1": "Иван",
+                            "A_ns_MPL_Name2": "Петров",
+                            "A_ns_MPL_Name3": f"Иванов{i}",
+                        }
+                        for i in range(self.mps)
+                    ]
+                },
+            )
+        if path.endswith("/coll-list/bg/3"):
+            return httpx.Response(
+                200,
+                json=[
+                    {"A_ns_C_id": i, "A_ns_CL_value": f"Комисия {i}"}
+                    for i in range(self.committees)
+                ],
+            )
+        if match := re.search(r"/mp-profile/bg/(\d+)$", path):
+            return httpx.Response(
+                200, json={"A_ns_MP_Email": f"mp{match.group(1)}@parliament.bg"}
+            )
+        if match := re.search(r"/coll-list-mp/bg/(\d+)/3$", path):
+            return httpx.Response(
+                200, json={"A_ns_CDemail": f"committee{match.group(1)}@parliament.bg"}
+            )
+        return httpx.Response(404)
+
+
+class SMTPSink:
+    """Local SMTP server that accepts every message."""
+
+    def __init__(self, hostname: str = "127.0.0.1", port: Optional[int] = None) -> None:
+        try:
+            from aiosmtpd.controller import Controller
+        except ImportError as e:
+            raise RuntimeError(
+                "the benchmarks need `aiosmtpd` for the local SMTP server"
+            ) from e
+        self.hostname = hostname
+        self.port = port or _free_port(hostname)
+        self.messages = 0
+        self.recipients: List[str] = []
+        self._controller = Controller(self, hostname=hostname, port=self.port)
+
+    async def handle_DATA(self, server, session, envelope) -> str:
+        self.messages += 1
+        self.recipients.extend(envelope.rcpt_tos)
+        return "250 Message accepted for delivery"
+
+    def start(self) -> None:
+        self._controller.start()
+
+    def stop(self) -> None:
+        self._controller.stop()
+
+
+def _body(content: bytes) -> Any:
+    return json.loads(content) if content else None
+
+
+def _free_port(hostname: str) -> int:
+    with socket.socket() as s:
+        s.bind((hostname, 0))
+        return s.getsockname()[1]
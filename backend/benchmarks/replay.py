@@ -0,0 +1,76 @@
+"""
+Replays an entity snapshot into the PocketBase stand-in.
+
+    python -m benchmarks.replay SNAPSHOT [--pb-latency 0.001] [--repeat 3]
+
+The first pass starts from an empty `entity` collection, as a new node would; the
+following ones find every entity already stored. Nothing is fetched from
+parliament.bg, so a snapshot taken in production reproduces that sync offline.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+import httpx
+
+from benchmarks.fakes import FakePocketBase
+
+
+async def replay(args: argparse.Namespace) -> None:
+    workdir = tempfile.mkdtemp(prefix="glas-replay-")
+    os.environ.update(
+        {
+            "POCKETBASE_URL": "http://pocketbase.bench",
+            "POCKETBASE_ADMIN": "bench@glas.bg",
+            "POCKETBASE_ADMIN_PW": "bench",
+            "SCRAPER_CACHE_DIR": os.path.join(workdir, "scraper_cache"),
+            "PB_REALTIME_INVALIDATION": "false",
+            "REDIS_URL": "",
+        }
+    )
+
+    from app.services.entity_maintainer import entity_maintainer
+    from app.services.entity_snapshot import read_snapshot
+    from app.services.pb_service import pb
+
+    fake_pb = FakePocketBase(latency=args.pb_latency)
+    pb.client = httpx.AsyncClient(base_url=pb.base_url, transport=fake_pb.transport())
+
+    started = time.perf_counter()
+    snapshot = read_snapshot(args.snapshot)
+    print(
+        f"read {len(snapshot.entities)} entities and {len(snapshot.responses)} payloads "
+        f"from {snapshot.source} ({snapshot.created.isoformat()}) "
+        f"in {time.perf_counter() - started:.3f}s"
+    )
+
+    print(f"{'pass':<6} {'seconds':>8} {'pb calls':>9}  reports")
+    for i in range(args.repeat):
+        pb_calls = fake_pb.calls
+        started = time.perf_counter()
+        reports = await entity_maintainer.replay_snapshot(args.snapshot, seed_cache=i == 0)
+        elapsed = time.perf_counter() - started
+        summary = ", ".join(
+            f"+{r.created} ~{r.updated} ={r.unchanged} -{r.deleted} !{r.failed}"
+            for r in reports
+        )
+        print(f"{i + 1:<6} {elapsed:>8.3f} {fake_pb.calls - pb_calls:>9}  {summary}")
+    await pb.aclose()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("snapshot")
+    parser.add_argument("--pb-latency", type=float, default=0.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(replay(parser.parse_args(argv)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
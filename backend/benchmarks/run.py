@@ -0,0 +1,373 @@
+"""
+Benchmarks the API and the entity sync against local stand-ins.
+
+    python -m benchmarks.run [--requests 200] [--concurrency 20] [--compare FILE]
+
+Results are written to `benchmarks/results/<commit>.json`. Passing `--compare` with
+the results of another commit prints the differences and exits with status 1 when a
+scenario's p95 latency or throughput regressed by more than `--threshold`.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.fakes import FakeParliament, FakePocketBase, SMTPSink
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _configure_environment(workdir: str, smtp: SMTPSink) -> None:
+    """Settings are read at import time, so this has to run before importing `app`."""
+    os.environ.update(
+        {
+            "POCKETBASE_URL": "http://pocketbase.bench",
+            "POCKETBASE_ADMIN": "bench@glas.bg",
+            "POCKETBASE_ADMIN_PW": "bench",
+            "USE_LOCAL_MAIL": "true",
+            "LOCAL_SMTP_HOST": smtp.hostname,
+            "LOCAL_SMTP_PORT": str(smtp.port),
+            "OUTBOX_DB_PATH": os.path.join(workdir, "outbox.sqlite3"),
+            "OUTBOX_POLL_SECONDS": "0.05",
+            "SCRAPER_CACHE_DIR": os.path.join(workdir, "scraper_cache"),
+            "SCRAPER_INITIAL_RATE": "1000",
+            "SCRAPER_MAX_RATE": "1000",
+            "SCRAPER_MAX_CONCURRENCY": "20",
+            "SYNC_INTERVAL_HOURS": "0",
+            "SYNC_SNAPSHOT_PATH": os.path.join(workdir, "entities.jsonl.gz"),
+            "PB_REALTIME_INVALIDATION": "false",
+            "REDIS_URL": "",
+            # Every benchmark request comes from the same address
+            "OTP_IP_LIMIT": "1000000",
+        }
+    )
+
+
+def _seed(fake: FakePocketBase, entities: int, templates: int, targets: int) -> List[str]:
+    entity_ids = [
+        fake.add(
+            "entity",
+            {
+                "name": f"Народен представител {i}",
+                "email": f"mp{i}@parliament.bg",
+                "ent_type": "mp",
+                "ent_source": f"https://parliament.bg/api/v1/mp-profile/bg/{i}",
+            },
+        )["id"]
+        for i in range(entities)
+    ]
+    template_ids = []
+    for i in range(templates):
+        start = (i * targets) % max(entities - targets, 1)
+        template = fake.add(
+            "template",
+            {
+                "name": f"Шаблон {i}",
+                "content": (
+                    "<p>Уважаеми {entity_name},</p>"
+                    "<p>Пиша Ви по повод на законопроекта. " * 20
+                    + "</p><p>С уважение, {sender_name} {sender_surname}</p>"
+                ),
+                "target_entities": entity_ids[start : start + targets],
+            },
+        )
+        template_ids.append(template["id"])
+    return template_ids
+
+
+def _summarize(
+    latencies: List[float], errors: int, elapsed: float, concurrency: int, pb_calls: int
+) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+            "p50": round(percentile(0.50), 3),
+            "p95": round(percentile(0.95), 3),
+            "p99": round(percentile(0.99), 3),
+            "max": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        },
+        "pb_calls": pb_calls,
+    }
+
+
+async def _measure(
+    fake: FakePocketBase,
+    requests: int,
+    concurrency: int,
+    call: Callable[[int], Awaitable[httpx.Response]],
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await call(i)
+            latencies.append(time.perf_counter() - started)
+            if response.is_error:
+                errors += 1
+
+    pb_calls = fake.calls
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return _summarize(
+        latencies, errors, time.perf_counter() - started, concurrency, fake.calls - pb_calls
+    )
+
+
+async def _wait_for_outbox(outbox: Any, timeout: float = 120.0) -> float:
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        stats = await outbox.stats()
+        if stats.depth == 0 and stats.in_flight == 0:
+            break
+        await asyncio.sleep(0.01)
+    return time.perf_counter() - started
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="glas-bench-")
+    smtp = SMTPSink()
+    smtp.start()
+    _configure_environment(workdir, smtp)
+
+    from app.core.config import settings
+    from app.core.security import hash_email
+    from app.main import app
+    from app.services.entity_maintainer import entity_maintainer
+    from app.services.otp_store import otp_store
+    from app.services.outbox import outbox
+    from app.services.pb_service import pb
+    from app.services.response_cache import ResponseCache
+
+    fake_pb = FakePocketBase(latency=args.pb_latency)
+    parliament = FakeParliament(args.entities, args.committees, args.parliament_latency)
+    # Clients are created lazily, so installing the stubs before startup is enough
+    pb.client = httpx.AsyncClient(base_url=pb.base_url, transport=fake_pb.transport())
+    entity_maintainer.client = httpx.AsyncClient(
+        base_url=entity_maintainer.base_url, transport=parliament.transport()
+    )
+    template_ids = _seed(fake_pb, args.entities, args.templates, args.targets)
+
+    n, c = args.requests, args.concurrency
+    scenarios: Dict[str, Dict[str, Any]] = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api") as api:
+
+            def person(i: int, prefix: str) -> Dict[str, Any]:
+                return {
+                    "name": "Иван",
+                    "surname": "Петров",
+                    "mail": f"{prefix}{i}@bench.glas.bg",
+                    "template_id": template_ids[i % len(template_ids)],
+                    "entity_id": "",
+                }
+
+            async def templates(i: int) -> httpx.Response:
+                return await api.get("/api/templates")
+
+            async def preview(i: int) -> httpx.Response:
+                template_id = template_ids[i % len(template_ids)]
+                return await api.get(
+                    f"/api/templates/{template_id}/preview",
+                    params={"name": "Иван", "surname": "Петров"},
+                )
+
+            async def request_otp(i: int) -> httpx.Response:
+                return await api.post("/api/request-otp", json=person(i, "otp"))
+
+            async def verify_and_send(i: int) -> httpx.Response:
+                body = person(i, "send")
+                entry = await otp_store.get(hash_email(body["mail"]))
+                body["otp_code"] = entry.code if entry is not None else 0
+                return await api.post("/api/verify-and-send", json=body)
+
+            for i in range(args.warmup):
+                await templates(i)
+                await preview(i)
+
+            scenarios["templates"] = await _measure(fake_pb, n, c, templates)
+            scenarios["preview"] = await _measure(fake_pb, n, c, preview)
+            scenarios["request_otp"] = await _measure(fake_pb, n, c, request_otp)
+
+            # Every verify needs its own pending code
+            await asyncio.gather(
+                *(api.post("/api/request-otp", json=person(i, "send")) for i in range(n))
+            )
+            await _wait_for_outbox(outbox)
+            delivered = smtp.messages
+            scenarios["verify_and_send"] = await _measure(fake_pb, n, c, verify_and_send)
+            pb_calls = fake_pb.calls
+            drain = await _wait_for_outbox(outbox)
+            letters = smtp.messages - delivered
+            scenarios["outbox_drain"] = {
+                "letters": letters,
+                "seconds": round(drain, 4),
+                "throughput_rps": round(letters / drain, 2) if drain else 0.0,
+                "pb_calls": fake_pb.calls - pb_calls,
+            }
+
+        async def sync(run: Callable[[], Awaitable[List[Any]]]) -> Dict[str, Any]:
+            pb_calls, upstream_calls = fake_pb.calls, parliament.calls
+            started = time.perf_counter()
+            reports = await run()
+            return {
+                "seconds": round(time.perf_counter() - started, 4),
+                "entities": sum(
+                    r.created + r.updated + r.unchanged + r.duplicates for r in reports
+                ),
+                "failed": sum(r.failed for r in reports),
+                "pb_calls": fake_pb.calls - pb_calls,
+                "upstream_calls": parliament.calls - upstream_calls,
+            }
+
+        for name, incremental in (("sync_full", False), ("sync_incremental", True)):
+            scenarios[name] = await sync(
+                lambda: entity_maintainer.run_full_sync(incremental=incremental)
+            )
+
+        # A new node: no entities and no scraper cache, only the last sync's snapshot
+        fake_pb.collections["entity"].clear()
+        entity_maintainer.cache = ResponseCache(os.path.join(workdir, "replay_cache"))
+        scenarios["sync_replay"] = await sync(
+            lambda: entity_maintainer.replay_snapshot(settings.SYNC_SNAPSHOT_PATH)
+        )
+
+    smtp.stop()
+    return scenarios
+
+
+def _git_commit() -> str:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+# Metrics compared between runs: (path, True if higher is better)
+_COMPARED = (
+    (("throughput_rps",), True),
+    (("latency_ms", "p95"), False),
+    (("seconds",), False),
+)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Prints the change of every compared metric. Returns True if any regressed."""
+    regressed = False
+    print(f"\n{'scenario':<18} {'metric':<16} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        for path, higher_is_better in _COMPARED:
+            old, new = _lookup(before, path), _lookup(result, path)
+            # Request scenarios are judged on throughput and p95, the rest on wall time
+            if old is None or new is None or not old:
+                continue
+            if path == ("seconds",) and "latency_ms" in result:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = " !" if worse > threshold else ""
+            regressed = regressed or bool(flag)
+            print(
+                f"{name:<18} {'.'.join(path):<16} {old:>12.2f} {new:>12.2f} {change:>+8.1%}{flag}"
+            )
+    return regressed
+
+
+def _lookup(data: Dict[str, Any], path: tuple) -> Optional[float]:
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data  # pyright: ignore[reportReturnType]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--entities", type=int, default=240)
+    parser.add_argument("--committees", type=int, default=25)
+    parser.add_argument("--templates", type=int, default=20)
+    parser.add_argument("--targets", type=int, default=5, help="entities per template")
+    parser.add_argument("--pb-latency", type=float, default=0.001)
+    parser.add_argument("--parliament-latency", type=float, default=0.005)
+    parser.add_argument("--output", help="results file, defaults to results/<commit>.json")
+    parser.add_argument("--compare", help="results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    commit = _git_commit()
+    scenarios = asyncio.run(run(args))
+    result = {
+        "commit": commit,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "threshold")},
+        "scenarios": scenarios,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(json.dumps(scenarios, indent=2))
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("params") != result["params"]:
+            print("warning: the runs used different parameters", file=sys.stderr)
+        if compare(result, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+import asyncio
+import time
+from email.message import EmailMessage
+
+import pytest
+
+from app.services.circuit_breaker import DependencyUnavailable, breakers
+from app.services.smtp_pool import SMTPPool
+
+
+async def _hanging_smtp(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Greets and accepts the envelope, then never answers DATA or QUIT."""
+    writer.write(b"220 hang ESMTP\r\n")
+    while line := await reader.readline():
+        command = line[:4].upper()
+        if command == b"EHLO":
+            writer.write(b"250 hang\r\n")
+        elif command in (b"MAIL", b"RCPT", b"RSET", b"NOOP"):
+            writer.write(b"250 OK\r\n")
+        else:
+            await asyncio.sleep(3600)
+        await writer.drain()
+
+
+def _message() -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = "sender@example.com"
+    message["To"] = "mp@example.com"
+    message["Subject"] = "test"
+    message.set_content("body")
+    return message
+
+
+def test_send_gives_up_within_call_timeout():
+    async def run() -> float:
+        server = await asyncio.start_server(_hanging_smtp, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        breakers.pop("smtp", None)
+        # The socket timeout is far longer than the call timeout, so only an abort
+        # that doesn't wait on the server returns in time
+        pool = SMTPPool("127.0.0.1", port, timeout=30.0, start_tls=False, call_timeout=1.0)
+        started = time.monotonic()
+        try:
+            with pytest.raises(DependencyUnavailable):
+                await pool.send(_message())
+            return time.monotonic() - started
+        finally:
+            breakers.pop("smtp", None)
+            await pool.close()
+            server.close()
+
+    assert asyncio.run(run()) < 1.5
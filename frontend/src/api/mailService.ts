@@ -3,7 +3,10 @@ import type { Template, MailForm } from '../types/mail'
 
 export const mailService = {
   async getTemplates() {
-    const res = await client.get<Template[]>('/templates')
+    // The content is rendered by the preview endpoint, so the list can skip it
+    const res = await client.get<Template[]>('/templates', {
+      params: { view: 'summary' }
+    })
     return res.data
   },
 
@@ -14,17 +17,20 @@ export const mailService = {
     return res.data
   },
 
-  async requestOTP(form: Omit<MailForm, 'otp'>) {
+  // Retries of one action reuse its idempotency key, so the backend sends only once
+  async requestOTP(form: Omit<MailForm, 'otp'>, idempotencyKey: string) {
     await client.post('/request-otp', {
       name: form.name,
       surname: form.surname,
       mail: form.mail,
       template_id: form.selected_template,
       entity_id: form.selected_entity
+    }, {
+      headers: { 'Idempotency-Key': idempotencyKey }
     })
   },
 
-  async verifyAndSend(form: MailForm) {
+  async verifyAndSend(form: MailForm, idempotencyKey: string) {
     await client.post('/verify-and-send', {
       mail: form.mail,
       otp_code: parseInt(form.otp),
@@ -32,6 +38,8 @@ export const mailService = {
       surname: form.surname,
       template_id: form.selected_template,
       entity_id: form.selected_entity
+    }, {
+      headers: { 'Idempotency-Key': idempotencyKey }
     })
   }
 }
@@ -16,6 +16,10 @@ export function useMailForm() {
 	const templates = ref<Template[]>([])
 	const entities = ref<Entity[]>([])
 
+	// One key per user action; a new OTP request or a new send gets a fresh one
+	let otpRequestKey = crypto.randomUUID()
+	let sendKey = crypto.randomUUID()
+
 	const form = ref<MailForm>({
 		name: '',
 		surname: '',
@@ -90,6 +94,7 @@ export function useMailForm() {
 			return
 		}
 		error.value = ''
+		otpRequestKey = crypto.randomUUID()
 		step.value = 2
 	}
 
@@ -97,7 +102,8 @@ export function useMailForm() {
 		try {
 			loading.value = true
 			error.value = ''
-			await mailService.requestOTP(form.value)
+			await mailService.requestOTP(form.value, otpRequestKey)
+			sendKey = crypto.randomUUID()
 			step.value = 3
 		} catch (err: any) {
 			error.value = err.response?.data?.detail || 'Грешка при изпращане на OTP.'
@@ -110,7 +116,7 @@ export function useMailForm() {
 		try {
 			loading.value = true
 			error.value = ''
-			await mailService.verifyAndSend(form.value)
+			await mailService.verifyAndSend(form.value, sendKey)
 			success.value = true
 			confetti({
 				particleCount: 150,
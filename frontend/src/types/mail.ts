@@ -15,7 +15,7 @@ export interface Entity {
 
 export interface Template {
 	id: string
-	content: string
+	content?: string
 	name: string
 	expand?: {
 		target_entities?: Entity[]